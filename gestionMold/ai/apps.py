@@ -1,6 +1,12 @@
 # ai/apps.py
 from django.apps import AppConfig
+from django.conf import settings
 
 class AiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField' 
-    name = 'ai'
\ No newline at end of file
+    name = 'ai'
+
+    def ready(self):
+        if settings.PRELOAD_AI_MODELS:
+            from .services import warm_up
+            warm_up()
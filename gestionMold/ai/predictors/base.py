@@ -1,12 +1,18 @@
+import threading
+
 import joblib
 from pathlib import Path
 
 class BasePredictor:
     _instances = {}
+    _lock = threading.Lock()
     @classmethod
     def instance(cls, model_path):
+        # Un seul chargement du modèle par processus, même sous requêtes concurrentes
         if cls not in cls._instances:
-            cls._instances[cls] = cls(model_path)
+            with cls._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = cls(model_path)
         return cls._instances[cls]
     def __init__(self, model_path):
         self.model_path = Path(model_path)
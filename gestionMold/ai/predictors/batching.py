@@ -0,0 +1,71 @@
+# ai/predictors/batching.py
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _Slot:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class BatchingPredictor:
+    def __init__(self, predictor, max_batch=64, max_wait=0.008, timeout=5.0):
+        """
+        Regroupe les prédictions unitaires concurrentes (jusqu'à `max_batch` entrées
+        ou `max_wait` secondes) en un seul appel à `predictor.predict_batch`.
+        """
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='batching-predictor', daemon=True)
+        self._thread.start()
+
+    def submit(self, data):
+        """
+        Soumet une entrée et attend son résultat
+        """
+        slot = _Slot()
+        self._queue.put((data, slot))
+        if not slot.event.wait(self.timeout):
+            raise TimeoutError("Prédiction non obtenue dans le délai imparti")
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self.predictor.predict_batch([data for data, _ in batch])
+            except Exception as e:
+                logger.error("Erreur de prédiction par lot: %s", e)
+                for _, slot in batch:
+                    slot.error = e
+                    slot.event.set()
+                continue
+            for (_, slot), result in zip(batch, results):
+                slot.result = result
+                slot.event.set()
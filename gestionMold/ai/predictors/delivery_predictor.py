@@ -2,14 +2,17 @@
 import pandas as pd
 import joblib
 from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.exceptions import NotFittedError
 from pathlib import Path
 import logging
 from datetime import datetime
 from typing import Dict, List, Union
 
+from .base import BasePredictor
+
 logger = logging.getLogger(__name__)
 
-class DeliveryPredictor:
+class DeliveryPredictor(BasePredictor):
     def __init__(self, model_path: str = 'models/delivery_model.pkl'):
         """
         Initialise le prédicteur de délais de livraison
@@ -97,15 +100,8 @@ class DeliveryPredictor:
             Dict: Contient la prédiction et des métadonnées
         """
         try:
-            # Préparation des caractéristiques
-            features = {
-                'distance': self._calculate_distance(order_data['client']['location']),
-                'quantity': order_data['total_quantity'],
-                'season': self._get_current_season()
-            }
-            
             # Conversion en dataframe pour la cohérence
-            X = pd.DataFrame([features])
+            X = pd.DataFrame([self._features(order_data)])
             
             # Prédiction
             prediction = self.model.predict(X)[0]
@@ -124,6 +120,41 @@ class DeliveryPredictor:
                 'fallback_prediction': self._get_fallback_prediction(order_data)
             }
 
+    def predict_batch(self, orders: List[Dict]) -> List[Dict[str, Union[float, str]]]:
+        """
+        Prédit plusieurs commandes en un seul appel au modèle
+        """
+        try:
+            X = pd.DataFrame([self._features(order_data) for order_data in orders])
+            predictions = self.model.predict(X)
+        except NotFittedError as e:
+            # Modèle pas encore entraîné ; une entrée mal formée n'est pas masquée
+            logger.error(f"Erreur de prédiction par lot: {str(e)}")
+            # Repli commande par commande (avec prédiction de secours)
+            return [self.predict(order_data) for order_data in orders]
+
+        version = self._get_model_version()
+        timestamp = datetime.now().isoformat()
+        return [
+            {
+                'prediction': max(0, round(float(prediction), 2)),
+                'unit': 'hours',
+                'model_version': version,
+                'timestamp': timestamp
+            }
+            for prediction in predictions
+        ]
+
+    def _features(self, order_data: Dict) -> Dict[str, float]:
+        """
+        Caractéristiques du modèle pour une commande
+        """
+        return {
+            'distance': self._calculate_distance(order_data['client']['location']),
+            'quantity': order_data['total_quantity'],
+            'season': self._get_current_season()
+        }
+
     @staticmethod
     def _calculate_distance(location: Dict[str, float]) -> float:
         """
@@ -5,14 +5,17 @@ import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
+from sklearn.exceptions import NotFittedError
 from pathlib import Path
 import logging
 from datetime import datetime
 from typing import Dict, List, Union, Optional
 
+from .base import BasePredictor
+
 logger = logging.getLogger(__name__)
 
-class InventoryPredictor:
+class InventoryPredictor(BasePredictor):
     """Prédicteur intelligent pour la gestion des stocks et réapprovisionnements"""
     
     def __init__(self, model_path: str = 'models/inventory_model.pkl'):
@@ -160,6 +163,36 @@ class InventoryPredictor:
                 'fallback_prediction': self._fallback_prediction(product_data)
             }
 
+    def predict_stockout_batch(self,
+                               products: List[Dict[str, Union[float, int]]],
+                               threshold: float = 0.6) -> List[Dict]:
+        """
+        Prédit le risque de rupture de plusieurs produits en un seul appel au modèle
+        """
+        try:
+            X = pd.DataFrame(products)[self.features]
+            probas = self.model.predict_proba(X)[:, 1]
+        except NotFittedError as e:
+            # Modèle pas encore entraîné ; une entrée mal formée n'est pas masquée
+            logger.error(f"Erreur de prédiction par lot: {str(e)}")
+            # Repli produit par produit (avec prédiction de secours)
+            return [self.predict_stockout(product_data, threshold) for product_data in products]
+
+        version = self._get_version()
+        timestamp = datetime.now().isoformat()
+        return [
+            {
+                'product_id': product_data.get('product_id', 'unknown'),
+                'stockout_risk': float(proba),
+                'prediction': bool(proba >= threshold),
+                'threshold': threshold,
+                'confidence': abs(proba - threshold),
+                'timestamp': timestamp,
+                'model_version': version
+            }
+            for product_data, proba in zip(products, probas)
+        ]
+
     def _get_version(self) -> str:
         """Génère un identifiant de version"""
         return f"inv-predictor-v1.{datetime.now().strftime('%Y%m%d')}"
@@ -3,13 +3,16 @@ import joblib
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.preprocessing import StandardScaler
+from sklearn.exceptions import NotFittedError
 from pathlib import Path
 import logging
 from datetime import datetime
 
+from .base import BasePredictor
+
 logger = logging.getLogger(__name__)
 
-class SalesPredictor:
+class SalesPredictor(BasePredictor):
     def __init__(self, model_path='models/sales_model.pkl'):
         """
         Initialise le prédicteur avec chargement du modèle
@@ -46,21 +49,47 @@ class SalesPredictor:
         self.scaler = StandardScaler()
         self.last_retrain_date = datetime.now().isoformat()
 
+    FEATURES = ('historique_ventes', 'stock_disponible', 'saison', 'prix', 'promotion')
+
     def preprocess_input(self, data):
         """
         Prétraite les données d'entrée
         """
         # Conversion en tableau numpy et normalisation
-        features = np.array([
-            data['historique_ventes'],
-            data['stock_disponible'],
-            data['saison'],
-            data['prix'],
-            data['promotion']
-        ]).reshape(1, -1)
+        features = np.array([data[name] for name in self.FEATURES]).reshape(1, -1)
         
         return self.scaler.transform(features)
 
+    def predict_batch(self, inputs):
+        """
+        Prédit plusieurs entrées en un seul appel au scaler et au modèle
+        """
+        try:
+            features = np.array([[data[name] for name in self.FEATURES] for data in inputs], dtype=float)
+            processed_data = self.scaler.transform(features)
+            predictions = np.maximum(self.model.predict(processed_data), 0)
+            confidences = np.maximum(
+                self.min_confidence,
+                1 - np.abs(processed_data[:, 0] - processed_data[:, 1]) / 100
+            )
+        except NotFittedError as e:
+            # Modèle pas encore entraîné ; une entrée mal formée n'est pas masquée
+            logger.error(f"Erreur de prédiction par lot: {str(e)}")
+            # Repli entrée par entrée (avec prédiction de secours)
+            return [self.predict(data) for data in inputs]
+
+        version = self.get_model_version()
+        timestamp = datetime.now().isoformat()
+        return [
+            {
+                'prediction': round(float(prediction), 2),
+                'confidence': round(float(confidence), 2),
+                'model_version': version,
+                'timestamp': timestamp
+            }
+            for prediction, confidence in zip(predictions, confidences)
+        ]
+
     def predict(self, input_data):
         """
         Effectue une prédiction avec gestion d'erreur
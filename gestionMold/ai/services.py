@@ -1,8 +1,10 @@
+import threading
+
 from django.core.cache import cache
 from django.conf import settings
-from .predictors.delivery_predictor import DeliveryPredictor
-from .predictors.inventory_predictor import InventoryPredictor
-from .predictors.sales_predictor import SalesPredictor
+
+# Les prédicteurs (pandas, sklearn) ne sont importés qu'au premier appel :
+# charger les urls, une commande manage.py ou un worker Celery n'en paie pas le coût.
 
 def _cached(key, fn, *args):
     res = cache.get(key)
@@ -12,13 +14,51 @@ def _cached(key, fn, *args):
     return res
 
 def predict_delivery(data):
+    from .predictors.delivery_predictor import DeliveryPredictor
     key = f"delivery:{data}"
     return _cached(key, DeliveryPredictor.instance(settings.DELIVERY_MODEL_PATH).predict, data)
 
 def predict_inventory(data):
-    key = f"inventory:{data.get('product_id')}"
+    from .predictors.inventory_predictor import InventoryPredictor
+    key = f"inventory:{tuple(data.items())}"
     return _cached(key, InventoryPredictor.instance(settings.INVENTORY_MODEL_PATH).predict_stockout, data)
 
+def predict_delivery_batch(items):
+    from .predictors.delivery_predictor import DeliveryPredictor
+    return DeliveryPredictor.instance(settings.DELIVERY_MODEL_PATH).predict_batch(items)
+
+def predict_inventory_batch(items):
+    from .predictors.inventory_predictor import InventoryPredictor
+    return InventoryPredictor.instance(settings.INVENTORY_MODEL_PATH).predict_stockout_batch(items)
+
+_sales_batcher = None
+_sales_batcher_lock = threading.Lock()
+
+def _get_sales_batcher():
+    # Créé au premier appel, donc après le fork des workers gunicorn
+    global _sales_batcher
+    if _sales_batcher is None:
+        with _sales_batcher_lock:
+            if _sales_batcher is None:
+                from .predictors.batching import BatchingPredictor
+                from .predictors.sales_predictor import SalesPredictor
+                _sales_batcher = BatchingPredictor(SalesPredictor.instance(settings.SALES_MODEL_PATH))
+    return _sales_batcher
+
 def predict_sales(data):
+    # Les requêtes concurrentes sont regroupées en un seul appel au modèle
     key = f"sales:{tuple(data.items())}"
-    return _cached(key, SalesPredictor.instance(settings.SALES_MODEL_PATH).predict, data)
+    return _cached(key, _get_sales_batcher().submit, data)
+
+def predict_sales_batch(items):
+    from .predictors.sales_predictor import SalesPredictor
+    return SalesPredictor.instance(settings.SALES_MODEL_PATH).predict_batch(items)
+
+def warm_up():
+    """Charge les modèles dans le processus courant (voir PRELOAD_AI_MODELS)."""
+    from .predictors.delivery_predictor import DeliveryPredictor
+    from .predictors.inventory_predictor import InventoryPredictor
+    from .predictors.sales_predictor import SalesPredictor
+    DeliveryPredictor.instance(settings.DELIVERY_MODEL_PATH)
+    InventoryPredictor.instance(settings.INVENTORY_MODEL_PATH)
+    SalesPredictor.instance(settings.SALES_MODEL_PATH)
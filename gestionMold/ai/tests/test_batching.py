@@ -0,0 +1,35 @@
+import threading
+
+from ai.predictors.batching import BatchingPredictor
+
+
+class EchoPredictor:
+    def __init__(self):
+        self.calls = []
+
+    def predict_batch(self, inputs):
+        self.calls.append(list(inputs))
+        return [value * 2 for value in inputs]
+
+
+def test_submit_returns_own_result():
+    batcher = BatchingPredictor(EchoPredictor())
+    assert batcher.submit(21) == 42
+
+
+def test_concurrent_submits_are_grouped():
+    predictor = EchoPredictor()
+    batcher = BatchingPredictor(predictor, max_batch=8, max_wait=0.2)
+    results = {}
+
+    def worker(value):
+        results[value] = batcher.submit(value)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == {i: i * 2 for i in range(8)}
+    assert len(predictor.calls) < 8
@@ -95,11 +95,7 @@ class OrderAdmin(admin.ModelAdmin):
     autocomplete_fields = ['client']
     inlines = [OrderLineInline]
     ordering = ('-date_ordered',)
-    readonly_fields = ('total',)
-
-    def client_username(self, obj):
-        return obj.client.user.username if obj.client and obj.client.user else "—"
-    client_username.short_description = "Client"
+    readonly_fields = ('total', 'client_username')
 
 
 @admin.register(OrderLine)
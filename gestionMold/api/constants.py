@@ -1 +1 @@
-UNIT_CHOICES = [('t', 'Tonne'),('kg','Kilogramme'),('g','Gramme'),('l','Litre')]
+UNIT_CHOICES = (('t', 'Tonne'),('kg','Kilogramme'),('g','Gramme'),('l','Litre'))
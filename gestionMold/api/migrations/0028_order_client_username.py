@@ -0,0 +1,25 @@
+# Generated by Django 4.2.21 on 2025-06-02 10:12
+
+from django.db import migrations, models
+
+
+def fill_client_username(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    for pk, username in Order.objects.values_list('pk', 'client__user__username'):
+        Order.objects.filter(pk=pk).update(client_username=username)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_alter_orderline_unit_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='client_username',
+            field=models.CharField(blank=True, editable=False, max_length=150, verbose_name="Nom d'utilisateur client"),
+        ),
+        migrations.RunPython(fill_client_username, migrations.RunPython.noop),
+    ]
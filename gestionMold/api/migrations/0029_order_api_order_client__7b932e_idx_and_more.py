@@ -0,0 +1,21 @@
+# Generated by Django 4.2.21 on 2025-06-02 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_order_client_username'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['client', 'order_status'], name='api_order_client__7b932e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderline',
+            index=models.Index(fields=['product', 'order'], name='api_orderli_product_eb1600_idx'),
+        ),
+    ]
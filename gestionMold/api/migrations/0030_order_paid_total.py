@@ -0,0 +1,32 @@
+# Generated by Django 4.2.21 on 2025-06-03 09:25
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_paid_total(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    Payment = apps.get_model('api', 'Payment')
+    totals = (
+        Payment.objects.filter(payment_status='PAID')
+        .values('order_id')
+        .annotate(paid=Sum('amount'))
+    )
+    for row in totals:
+        Order.objects.filter(pk=row['order_id']).update(paid_total=row['paid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_order_api_order_client__7b932e_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Total payé'),
+        ),
+        migrations.RunPython(fill_paid_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2025-06-03 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_order_paid_total'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['order', 'payment_status'], name='api_payment_order_i_308e11_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.21 on 2025-06-04 10:12
+
+from django.db import migrations, models
+
+
+def fill_loyalty_awarded(apps, schema_editor):
+    Order = apps.get_model('api', 'Order')
+    LoyaltyProgram = apps.get_model('api', 'LoyaltyProgram')
+    awarded = set()
+    for transactions in LoyaltyProgram.objects.values_list('transactions', flat=True):
+        for txn in transactions or []:
+            if txn.get('order') and txn.get('points', 0) > 0:
+                awarded.add(txn['order'])
+    if awarded:
+        Order.objects.filter(pk__in=awarded).update(loyalty_awarded=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_payment_api_payment_order_i_308e11_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='loyalty_awarded',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Points fidélité attribués'),
+        ),
+        migrations.RunPython(fill_loyalty_awarded, migrations.RunPython.noop),
+    ]
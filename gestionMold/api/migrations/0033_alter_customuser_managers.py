@@ -0,0 +1,20 @@
+# Generated by Django 4.2.21 on 2025-06-04 14:37
+
+import api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_order_loyalty_awarded'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='customuser',
+            managers=[
+                ('objects', api.models.CustomUserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2025-06-05 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_alter_customuser_managers'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['expiration_date'], name='api_product_expirat_393115_idx'),
+        ),
+    ]
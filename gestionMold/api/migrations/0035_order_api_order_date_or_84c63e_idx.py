@@ -0,0 +1,17 @@
+# Generated by Django 4.2.21 on 2025-06-05 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0034_product_api_product_expirat_393115_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['date_ordered'], name='api_order_date_or_84c63e_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.21 on 2025-06-05 11:02
+
+from django.db import migrations
+from django.db.models import Sum
+
+
+def resync_paid_total(apps, schema_editor):
+    # Les suppressions et changements de statut n'étaient pas répercutés : recalcul complet
+    Order = apps.get_model('api', 'Order')
+    Payment = apps.get_model('api', 'Payment')
+    Order.objects.update(paid_total=0)
+    totals = (
+        Payment.objects.filter(payment_status='PAID')
+        .values('order_id')
+        .annotate(paid=Sum('amount'))
+    )
+    for row in totals:
+        Order.objects.filter(pk=row['order_id']).update(paid_total=row['paid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_order_api_order_date_or_84c63e_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(resync_paid_total, migrations.RunPython.noop),
+    ]
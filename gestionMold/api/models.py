@@ -1,26 +1,115 @@
+import hashlib
+import json
 import uuid
-from io import BytesIO
 from datetime import timedelta
+from decimal import Decimal
 
 # Django imports
 from django.conf import settings
-from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.core.cache import cache
+from django.contrib.auth.models import AbstractUser, Group, Permission, UserManager
 from django.core.exceptions import ValidationError
-from django.core.files import File
 from django.core.validators import FileExtensionValidator, MinValueValidator
-from django.db import models, transaction
-from django.db.models import F, Sum, Index
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Func, Index, Sum, Value, When
+from django.db.models.functions import Greatest
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-import qrcode
 
 # Local imports
 from .constants import UNIT_CHOICES
 from .utils import send_alert, generate_pdf  # suppose generate_pdf exists
 
 
+class JSONArrayAppend(Func):
+    """
+    Ajoute `entry` en fin du tableau JSON `field` côté base : l'historique
+    n'est jamais relu ni ré-encodé en Python, seule l'entrée est sérialisée.
+    """
+    output_field = models.JSONField()
+
+    def __init__(self, field, entry, **extra):
+        super().__init__(F(field), Value(json.dumps(entry)), **extra)
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="JSON_ARRAY_APPEND(%(expressions)s AS JSON))",
+            arg_joiner=", '$', CAST(",
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="(%(expressions)s::jsonb))",
+            arg_joiner=" || jsonb_build_array(",
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="json_insert(%(expressions)s))",
+            arg_joiner=", '$[#]', json(",
+            **extra_context
+        )
+
+
+
+class DaysUntil(Func):
+    """
+    Jours entiers restants avant l'horodatage `expression` (négatif une fois passé),
+    calculés par la base : MySQL et SQLite n'ont pas d'Extract sur une durée.
+    """
+    output_field = models.IntegerField()
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        # Horodatages stockés en UTC (USE_TZ)
+        return self.as_sql(
+            compiler, connection,
+            template="TIMESTAMPDIFF(DAY, UTC_TIMESTAMP(6), %(expressions)s)",
+            **extra_context
+        )
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="EXTRACT(DAY FROM (%(expressions)s - CURRENT_TIMESTAMP))::integer",
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler, connection,
+            template="CAST(julianday(%(expressions)s) - julianday('now') AS INTEGER)",
+            **extra_context
+        )
+
+
 # ---------- Utilisateur personnalisé avec audit ----------
 
+class CustomUserManager(UserManager):
+
+    def bulk_create_clients(self, users, batch_size=500):
+        """
+        Import en masse de clients : un INSERT groupé pour les utilisateurs, un pour
+        les profils. Ni save() ni post_save : pas de SMS de bienvenue.
+        """
+        for user in users:
+            user.is_client = True
+            user.normalize_fields()
+        with transaction.atomic():
+            self.bulk_create(users, batch_size=batch_size)
+            # MySQL ne renvoie pas les ids d'un INSERT multi-lignes : relecture par email
+            ids = self.filter(email__in=[user.email for user in users]).values_list('id', flat=True)
+            ClientProfile.objects.bulk_create(
+                [ClientProfile(user_id=pk) for pk in ids],
+                batch_size=batch_size, ignore_conflicts=True
+            )
+        return users
+
+
 class CustomUser(AbstractUser):
     """
     Extension de AbstractUser pour gérer rôles, permissions et audit.
@@ -58,6 +147,8 @@ class CustomUser(AbstractUser):
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
+    objects = CustomUserManager()
+
     class Meta:
         verbose_name = _("Utilisateur")
         verbose_name_plural = _("Utilisateurs")
@@ -66,21 +157,29 @@ class CustomUser(AbstractUser):
             Index(fields=['username']),
         ]
 
-    def save(self, *args, **kwargs):
+    def normalize_fields(self):
         self.email = self.email.lower().strip()
-        
-        # Vérifie qu’un autre utilisateur n’a pas déjà cet email
-        if not self.pk and CustomUser.objects.filter(email=self.email).exists():
-            raise ValidationError({'email': _("Cet email est déjà utilisé.")})
-        
+
         # Génération d’un username unique si vide
         if not self.username:
             base = f"{self.first_name[0] if self.first_name else 'u'}{self.last_name}".lower()
             base = base or self.email.split('@')[0]
             unique_suffix = uuid.uuid4().hex[:4]
             self.username = f"{base}-{unique_suffix}"
-        
-        super().save(*args, **kwargs)
+
+    def save(self, *args, **kwargs):
+        self.normalize_fields()
+
+        # L'unicité de l'email est garantie par la contrainte UNIQUE : pas de SELECT
+        # préalable. En cas d'échec, le doublon est vérifié par une requête, le
+        # message de l'erreur d'intégrité dépendant de la base et du pilote.
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if CustomUser.objects.filter(email=self.email).exclude(pk=self.pk).exists():
+                raise ValidationError({'email': _("Cet email est déjà utilisé.")})
+            raise
 
     def __str__(self):
         return self.get_full_name() or self.username
@@ -168,6 +267,7 @@ class Product(models.Model):
         indexes = [
             Index(fields=['name']),
             Index(fields=['category']),
+            Index(fields=['expiration_date']),
         ]
 
     def clean(self):
@@ -175,25 +275,42 @@ class Product(models.Model):
             raise ValidationError({'name': _("Le nom du produit est obligatoire.")})
         if not self.category:
             raise ValidationError({'category': _("La catégorie est obligatoire.")})
-        if self.expiration_date and self.expiration_date < timezone.now().date():
+        if self.expiration_date and self.expiration_date < timezone.localdate():
             raise ValidationError({'expiration_date': _("Date d'expiration dépassée.")})
 
     def save(self, *args, **kwargs):
         self.clean()
-        regenerate = not self.pk or not self.qr_code_image
-        if not regenerate:
-            old = Product.objects.filter(pk=self.pk).values('name', 'selling_price').first()
-            if old and (old['name'] != self.name or old['selling_price'] != self.selling_price):
-                regenerate = True
+        # Une seule lecture des anciennes valeurs, partagée avec les signaux de stock (_old_stock)
+        old = None
+        if self.pk:
+            old = Product.objects.filter(pk=self.pk).values('name', 'selling_price', 'quantity_in_stock').first()
+        self._old_stock = old['quantity_in_stock'] if old else None
+        regenerate = (
+            old is None or not self.qr_code_image
+            or old['name'] != self.name or old['selling_price'] != self.selling_price
+        )
         if regenerate:
-            qr = qrcode.QRCode(version=1, box_size=10, border=4)
-            qr.add_data(f"Produit: {self.name} | Prix: {self.selling_price}")
-            qr.make(fit=True)
-            img = qr.make_image(fill_color='black', back_color='white')
-            buf = BytesIO()
-            img.save(buf, format='PNG')
-            self.qr_code_image.save(f"qr_{uuid.uuid4().hex}.png", File(buf), save=False)
+            # Chemin déterministe : le fichier et, à la création, la colonne
+            # sont écrits par un worker après le commit
+            payload = self.qr_code_payload(self.name, self.selling_price)
+            if self.pk:
+                self.qr_code_image.name = self.qr_code_path(self.pk, payload)
         super().save(*args, **kwargs)
+        if regenerate:
+            from .tasks import generate_product_qr
+
+            product_id = self.pk
+            transaction.on_commit(lambda: generate_product_qr.delay(product_id, payload))
+
+    @staticmethod
+    def qr_code_payload(name, selling_price):
+        # Prix à deux décimales : même texte avant et après le passage en base
+        return f"Produit: {name} | Prix: {Decimal(str(selling_price)):.2f}"
+
+    @staticmethod
+    def qr_code_path(pk, payload):
+        # L'id distingue deux produits de même nom et même prix
+        return f"qr_codes/qr_{hashlib.sha1(f'{pk}|{payload}'.encode()).hexdigest()[:16]}.png"
 
         
     def delete(self, *args, **kwargs):
@@ -214,11 +331,11 @@ class Supplier(models.Model):
     ENGRAIS = 'ENGRAIS'
     SEMENCES = 'SEMENCES'
     OUTILS = 'OUTILS'
-    TYPE_CHOICES = [
+    TYPE_CHOICES = (
         (ENGRAIS, _('Engrais')),
         (SEMENCES, _('Semences')),
         (OUTILS, _('Outils agricoles')),
-    ]
+    )
 
     name = models.CharField(
         max_length=100,
@@ -340,11 +457,11 @@ class StockMovement(models.Model):
     OUT = 'OUT'
     ADJ = 'ADJ'
 
-    MOVEMENT_CHOICES = [
+    MOVEMENT_CHOICES = (
         (IN, _('Entrée')),
         (OUT, _('Sortie')),
         (ADJ, _('Ajustement')),
-    ]
+    )
 
     product = models.ForeignKey(
         'Product',
@@ -395,13 +512,6 @@ class StockMovement(models.Model):
         super().save(*args, **kwargs)
 
         if is_new:
-            # Mise à jour ou création du niveau de stock
-            niveau, created = StockLevel.objects.get_or_create(
-                product=self.product,
-                warehouse=self.warehouse,
-                defaults={'quantity': 0}
-            )
-
             # Ajustement en fonction du type
             ajustement = self.quantity
             if self.movement_type == self.OUT:
@@ -409,9 +519,19 @@ class StockMovement(models.Model):
             elif self.movement_type == self.ADJ:
                 ajustement = self.quantity  # tu peux le rendre plus explicite selon les besoins
 
-            niveau.quantity = F('quantity') + ajustement
-            niveau.save()
-            niveau.refresh_from_db()
+            # Un seul UPDATE si le niveau existe, INSERT uniquement au premier mouvement
+            niveaux = StockLevel.objects.filter(product_id=self.product_id, warehouse_id=self.warehouse_id)
+            if not niveaux.update(quantity=F('quantity') + ajustement):
+                try:
+                    with transaction.atomic():
+                        StockLevel.objects.create(
+                            product_id=self.product_id,
+                            warehouse_id=self.warehouse_id,
+                            quantity=ajustement
+                        )
+                except IntegrityError:
+                    # Créé entre-temps par un mouvement concurrent
+                    niveaux.update(quantity=F('quantity') + ajustement)
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.product} ({self.quantity})"
@@ -455,12 +575,12 @@ class Order(models.Model):
     EN_COURS = 'EN_COURS'
     DELIVERED = 'DELIVERED'
     CANCELLED = 'CANCELLED'
-    STATUS_CHOICES = [
+    STATUS_CHOICES = (
         (PENDING, _('En attente')),
         (EN_COURS, _('En cours')),
         (DELIVERED, _('Livrée')),
         (CANCELLED, _('Annulée')),
-    ]
+    )
 
     client = models.ForeignKey(
         ClientProfile,
@@ -484,32 +604,74 @@ class Order(models.Model):
         verbose_name=_("Total"),
         default=0,
     )
+    # Somme des paiements PAID, maintenue par Payment.save
+    paid_total = models.DecimalField(
+        max_digits=10, decimal_places=2,
+        default=0,
+        editable=False,
+        verbose_name=_("Total payé")
+    )
+    # Copie de client.user.username pour éviter deux JOIN sur les listes
+    client_username = models.CharField(
+        max_length=150,
+        blank=True,
+        editable=False,
+        verbose_name=_("Nom d'utilisateur client")
+    )
+    # Marqueur d'idempotence des points fidélité (remplace le parcours des transactions)
+    loyalty_awarded = models.BooleanField(
+        default=False,
+        editable=False,
+        verbose_name=_("Points fidélité attribués")
+    )
 
     class Meta:
         verbose_name = _("Commande")
         verbose_name_plural = _("Commandes")
+        indexes = [
+            Index(fields=['client', 'order_status']),
+            Index(fields=['date_ordered']),
+        ]
 
     def update_total(self):
-        total = sum(line.unit_price * line.quantity for line in self.lignes_commandes.all())
+        # Calcul côté base : aucune ligne matérialisée en Python
+        total = self.lignes_commandes.aggregate(
+            total=Sum(
+                F('unit_price') * F('quantity'),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            )
+        )['total'] or 0
         self.total = total
         self.save(update_fields=['total'])
 
+    @classmethod
+    def adjust_paid_total(cls, order_id, delta):
+        # Incrément en base : les paiements ne sont pas re-sommés
+        if delta:
+            cls.objects.filter(pk=order_id).update(paid_total=F('paid_total') + delta)
+
     def update_status_if_paid(self):
-        paid = self.payments.filter(payment_status='PAID').aggregate(sum=Sum('amount'))['sum'] or 0
-        if paid >= self.total and self.order_status != self.EN_COURS:
+        # UPDATE conditionnel : ni relecture, ni full_clean, ni cascade de signaux
+        updated = Order.objects.filter(
+            pk=self.pk, paid_total__gte=F('total')
+        ).exclude(order_status=self.EN_COURS).update(order_status=self.EN_COURS)
+        if updated:
             self.order_status = self.EN_COURS
-            self.save(update_fields=['order_status'])
+        return bool(updated)
 
     def clean(self):
-        if not self.lignes_commandes.exists():
+        # Les lignes ne peuvent exister qu'une fois la commande enregistrée
+        if self.pk and not self.lignes_commandes.exists():
             raise ValidationError("Une commande doit contenir au moins une ligne de commande.")
 
     def save(self, *args, **kwargs):
+        if not self.pk and not self.client_username:
+            self.client_username = self.client.user.username
         self.full_clean()  # Appelle clean() avant de sauvegarder
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"Commande #{self.id} – {self.client.user.username}"
+        return f"Commande #{self.id} – {self.client_username}"
 
 
 class OrderLine(models.Model):
@@ -543,6 +705,9 @@ class OrderLine(models.Model):
     class Meta:
         verbose_name = _("Ligne de commande")
         verbose_name_plural = _("Lignes de commande")
+        indexes = [
+            Index(fields=['product', 'order']),
+        ]
     
     def save(self, *args, **kwargs):
         # Calcule automatiquement le prix unitaire à partir du produit
@@ -641,7 +806,7 @@ class ExchangeRequest(models.Model):
     )
     exchange_status = models.CharField(
         max_length=20,
-        choices=[('PENDING', _('En attente')), ('COMPLETED', _('Terminé'))],
+        choices=(('PENDING', _('En attente')), ('COMPLETED', _('Terminé'))),
         default='PENDING',
         verbose_name=_("Statut échange")
     )
@@ -787,7 +952,7 @@ class Payment(models.Model):
     """
     Paiement associé à une commande.
     """
-    PAYMENT_METHODS = [
+    PAYMENT_METHODS = (
         ('CARD', _('Carte bancaire')),
         ('BANK', _('Virement')),
         ('MOBILE', _('Mobile Money')),
@@ -795,15 +960,15 @@ class Payment(models.Model):
         ('APPLE_PAY', _('Apple Pay')),
         ('GOOGLE_PAY', _('Google Pay')),
         ('BALANCE', _('Solde client')),
-    ]
+    )
     PENDING = 'PENDING'
     PAID = 'PAID'
     FAILED = 'FAILED'
-    STATUS_CHOICES = [
+    STATUS_CHOICES = (
         (PENDING, _('En attente')),
         (PAID, _('Payé')),
         (FAILED, _('Échoué')),
-    ]
+    )
 
     order = models.ForeignKey(
         Order,
@@ -835,18 +1000,41 @@ class Payment(models.Model):
     class Meta:
         verbose_name = _("Paiement")
         verbose_name_plural = _("Paiements")
+        indexes = [
+            Index(fields=['order', 'payment_status']),
+        ]
     
+    def paid_amount(self):
+        """Part de ce paiement dans Order.paid_total."""
+        return self.amount if self.payment_status == self.PAID else 0
+
+    def paid_amount_in_db(self):
+        if self.pk is None:
+            return 0
+        return Payment.objects.filter(pk=self.pk, payment_status=self.PAID).values_list('amount', flat=True).first() or 0
+
     def clean(self):
-        # Total déjà payé pour cette commande (hors ce paiement s'il existe déjà)
-        total_paid = self.order.payments.exclude(pk=self.pk).filter(payment_status=self.PAID).aggregate(sum=Sum('amount'))['sum'] or 0
-        reste = self.order.total - total_paid
+        # paid_total tenu à jour par save() ; la part actuelle de ce paiement en est retirée
+        previous = self._previous_paid if self._previous_paid is not None else self.paid_amount_in_db()
+        reste = self.order.total - (self.order.paid_total - previous)
         if self.amount > reste:
             raise ValidationError("Le montant du paiement dépasse le total dû pour cette commande.")
 
+    _previous_paid = None
+
     def save(self, *args, **kwargs):
-        self.full_clean()  # Appelle clean() avant de sauvegarder
-        # Enregistrement du paiement
         with transaction.atomic():
+            # Commande verrouillée : paid_total lu puis ajusté sans écriture concurrente
+            self.order.total, self.order.paid_total = (
+                Order.objects.select_for_update().filter(pk=self.order_id)
+                .values_list('total', 'paid_total').get()
+            )
+            self._previous_paid = self.paid_amount_in_db()
+            try:
+                self.full_clean()  # Appelle clean() avant de sauvegarder
+            finally:
+                previous, self._previous_paid = self._previous_paid, None
+            # Enregistrement du paiement
             is_new = self.pk is None
             super().save(*args, **kwargs)
             PaymentLog.objects.create(
@@ -858,6 +1046,11 @@ class Payment(models.Model):
             if self.payment_status == self.PAID and not self.paid_at:
                 self.paid_at = timezone.now()
                 super().save(update_fields=['paid_at'])
+            # Création, changement de statut ou de montant : seul l'écart est reporté
+            delta = self.paid_amount() - previous
+            Order.adjust_paid_total(self.order_id, delta)
+            self.order.paid_total += delta
+            if self.payment_status == self.PAID:
                 self.order.update_status_if_paid()
 
     def __str__(self):
@@ -1029,12 +1222,11 @@ class StockAlert(models.Model):
                 f"Stock faible pour {self.product.name}: "
                 f"{self.product.quantity_in_stock} unités restantes."
             )
-            send_alert(self.product.category, message)
-            Notification.objects.create(
-                user=self.product.category.user,
-                message=message,
-                link=f"/products/{self.product.id}/",
-                read=False
+            # send_alert crée aussi la Notification de chaque administrateur
+            send_alert(
+                CustomUser.objects.filter(is_staff=True, is_active=True),
+                message,
+                link=f"/products/{self.product.id}/"
             )
 
     def __str__(self):
@@ -1045,7 +1237,7 @@ class ProductReview(models.Model):
     """
     Avis laissé par un client sur un produit.
     """
-    RATING_CHOICES = [(i, '★'*i + '☆'*(5-i)) for i in range(1,6)]
+    RATING_CHOICES = tuple((i, '★'*i + '☆'*(5-i)) for i in range(1,6))
 
     client = models.ForeignKey(
         ClientProfile,
@@ -1085,6 +1277,18 @@ class ProductReview(models.Model):
         return f"{self.rating}/5 – {self.product.name}"
 
 
+class RefundRequestQuerySet(models.QuerySet):
+
+    def with_days_remaining(self):
+        # Jours restants dans la fenêtre de remboursement (0 si non livrée ou expirée)
+        deadline = F('order__date_ordered') + Value(RefundRequest.REFUND_WINDOW)
+        return self.annotate(days_remaining=Case(
+            When(order__order_status=Order.DELIVERED, then=Greatest(DaysUntil(deadline), Value(0))),
+            default=Value(0),
+            output_field=models.IntegerField(),
+        ))
+
+
 class RefundRequest(models.Model):
     """
     Demande de remboursement.
@@ -1105,11 +1309,11 @@ class RefundRequest(models.Model):
     )
     refund_status = models.CharField(
         max_length=20,
-        choices=[
+        choices=(
             ('PENDING', _('En attente')),
             ('APPROVED', _('Approuvé')),
             ('REJECTED', _('Rejeté'))
-        ],
+        ),
         default='PENDING',
         verbose_name=_("Statut remboursement")
     )
@@ -1126,11 +1330,15 @@ class RefundRequest(models.Model):
         verbose_name = _("Demande de remboursement")
         verbose_name_plural = _("Demandes de remboursement")
 
+    REFUND_WINDOW = timedelta(days=14)
+
+    objects = RefundRequestQuerySet.as_manager()
+
     @property
     def is_eligible(self):
         return (
-            self.order.status == Order.DELIVERED and
-            (timezone.now() - self.order.date_ordered) <= timedelta(days=14)
+            self.order.order_status == Order.DELIVERED and
+            (timezone.now() - self.order.date_ordered) <= self.REFUND_WINDOW
         )
     def delete(self, *args, **kwargs):
         if self.evidence:
@@ -1139,7 +1347,7 @@ class RefundRequest(models.Model):
         # Delete the associated evidence file if it exists
         
     def __str__(self):
-        return f"Remb #{self.id} – {self.get_status_display()}"
+        return f"Remb #{self.id} – {self.get_refund_status_display()}"
 
 
 class LoyaltyProgram(models.Model):
@@ -1169,16 +1377,32 @@ class LoyaltyProgram(models.Model):
         verbose_name = _("Programme de fidélité")
         verbose_name_plural = _("Programmes de fidélité")
 
+    @staticmethod
+    def cache_key(user_id):
+        return f"loyalty:{user_id}:v1"
+
+    def invalidate_cache(self):
+        # Après commit : une lecture concurrente ne peut pas remettre l'ancien état en cache
+        key = self.cache_key(self.client.user_id)
+        transaction.on_commit(lambda: cache.delete(key))
+
     def add_points(self, order):
         earned = int(order.total // 10)
-        LoyaltyProgram.objects.filter(pk=self.pk).update(points=F('points') + earned)
-        self.refresh_from_db()
-        self.transactions.append({
-            'date': timezone.now().isoformat(),
+        now = timezone.now()
+        entry = {
+            'date': now.isoformat(),
             'order': order.id,
             'points': earned
-        })
-        self.save(update_fields=['transactions'])
+        }
+        # Points et historique mis à jour en un seul UPDATE, sans relecture
+        LoyaltyProgram.objects.filter(pk=self.pk).update(
+            points=F('points') + earned,
+            transactions=JSONArrayAppend('transactions', entry),
+            last_updated=now
+        )
+        self.points += earned
+        self.transactions.append(entry)
+        self.invalidate_cache()
         return earned
 
     def __str__(self):
@@ -1186,15 +1410,22 @@ class LoyaltyProgram(models.Model):
 
     
     def use_points(self, points, reason="Utilisation", order=None):
-        if self.points < points:
+        now = timezone.now()
+        entry = {
+            'date': now.isoformat(),
+            'order': order.id if order else None,
+            'points': -points,
+            'reason': reason
+        }
+        # La condition sur le solde est vérifiée par la base : pas de course
+        updated = LoyaltyProgram.objects.filter(pk=self.pk, points__gte=points).update(
+            points=F('points') - points,
+            transactions=JSONArrayAppend('transactions', entry),
+            last_updated=now
+        )
+        if not updated:
             raise ValidationError("Pas assez de points.")
-        LoyaltyProgram.objects.filter(pk=self.pk).update(points=F('points') - points)
-        self.refresh_from_db()
-        self.transactions.append({
-        'date': timezone.now().isoformat(),
-        'order': order.id if order else None,
-        'points': -points,
-        'reason': reason
-    })
-        self.save(update_fields=['transactions'])
-        return points
\ No newline at end of file
+        self.points -= points
+        self.transactions.append(entry)
+        self.invalidate_cache()
+        return points
@@ -0,0 +1,52 @@
+# api/pagination.py
+
+import hashlib
+from functools import partial
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator dont le COUNT(*) est mis en cache 60 s, par requête SQL.
+    La première page recalcule toujours le total.
+    """
+    count_timeout = 60
+
+    def __init__(self, *args, refresh=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh = refresh
+
+    @cached_property
+    def count(self):
+        try:
+            sql = str(self.object_list.query)
+        except Exception:
+            # Liste Python ou requête vide (EmptyResultSet) : pas de cache
+            return super().count
+        key = 'page_count:' + hashlib.md5(sql.encode()).hexdigest()
+        count = None if self.refresh else cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+
+class CachedCountPagination(PageNumberPagination):
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_number = request.query_params.get(self.page_query_param, '1')
+        self.django_paginator_class = partial(CachedCountPaginator, refresh=page_number == '1')
+        return super().paginate_queryset(queryset, request, view)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Pagination par curseur sur la clé primaire, pour les journaux qui ne font que grossir :
+    chaque page est une recherche d'index, quelle que soit sa profondeur.
+    """
+    ordering = '-id'
+    page_size = 50
@@ -60,7 +60,8 @@ class IsAdminOrDelivererOrOrderOwner(BasePermission):
 
         # Lecture : le client à qui appartient la commande
         if request.method in SAFE_METHODS:
-            return obj.order.client.user == user
+            # Comparaison sur les ids : ni client.user ni deliverer à charger
+            return obj.order is not None and obj.order.client.user_id == user.id
 
         # Écriture : le livreur assigné
-        return obj.deliverer == user
+        return obj.deliverer_id == user.id
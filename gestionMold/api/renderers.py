@@ -0,0 +1,28 @@
+# api/renderers.py
+
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# Types qu'orjson ne connaît pas (Decimal, textes paresseux, QuerySet…) :
+# même conversion que l'encodeur JSON de DRF
+_drf_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    Rendu JSON via orjson (implémentation C) à la place du module json standard.
+    """
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # OPT_NON_STR_KEYS : erreurs de validation de ListField indexées par entier
+        option = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        # L'API navigable demande une sortie indentée
+        if renderer_context and renderer_context.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_drf_encoder.default, option=option)
@@ -1,13 +1,15 @@
-from datetime import timedelta
+import copy
+from collections import defaultdict, deque
 
-from django.utils import timezone
 from django.contrib.auth.password_validation import validate_password
-from django.db import transaction, IntegrityError
-from django.db.models import Q, Sum
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import connections, transaction, IntegrityError
+from django.db.models import F, Max, Prefetch
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
-from drf_spectacular.utils import extend_schema_field
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 
 from .models import (
     CustomUser, Category, Product, Supplier,
@@ -19,10 +21,54 @@ from .models import (
     StockAlert, ProductReview, RefundRequest,
     LoyaltyProgram,
 )
+from .tokens import CachedBlacklistRefreshToken
 
 User = get_user_model()
 
 
+# Champs qui contiennent un autre champ (enfant lié au parent) : copie profonde
+NESTED_FIELD_TYPES = (serializers.BaseSerializer, serializers.ManyRelatedField)
+
+
+class CachedFieldsSerializerMixin:
+    """
+    Construit les champs une seule fois par classe (introspection du modèle comprise),
+    puis en donne une copie superficielle à chaque instance.
+    """
+    _fields_cache = {}
+
+    def get_fields(self):
+        cls = type(self)
+        fields = self._fields_cache.get(cls)
+        if fields is None:
+            fields = self._fields_cache[cls] = super().get_fields()
+        return {
+            name: copy.deepcopy(field) if isinstance(field, NESTED_FIELD_TYPES) else copy.copy(field)
+            for name, field in fields.items()
+        }
+
+
+class BulkCreateListSerializer(serializers.ListSerializer):
+    """
+    Création d'une liste en une seule transaction. INSERT multi-lignes (ni save() ni
+    post_save) si la base renvoie les ids créés, sinon un INSERT par objet : MySQL ne
+    les renvoie pas et la réponse n'aurait que des "id": null.
+    """
+    batch_size = 1000
+    # False pour les modèles dont save() a des effets de bord à conserver
+    bulk_insert = True
+
+    def create(self, validated_data):
+        model = self.child.Meta.model
+        objs = [model(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            if self.bulk_insert and connections[model.objects.db].features.can_return_rows_from_bulk_insert:
+                return model.objects.bulk_create(objs, batch_size=self.batch_size)
+            for obj in objs:
+                obj.save(force_insert=True)
+        return objs
+
+
 # ----------- User serializers -----------
 
 class RegistrationSerializer(serializers.ModelSerializer):
@@ -33,8 +79,6 @@ class RegistrationSerializer(serializers.ModelSerializer):
         fields = ('first_name', 'last_name', 'email', 'password')
 
     def validate_email(self, value):
-        if CustomUser.objects.filter(email=value.lower()).exists():
-            raise serializers.ValidationError(_("Email déjà utilisé"))
         return value.lower()
 
     def create(self, validated_data):
@@ -44,7 +88,11 @@ class RegistrationSerializer(serializers.ModelSerializer):
             last_name=validated_data['last_name']
         )
         user.set_password(validated_data['password'])
-        user.save()
+        try:
+            user.save()
+        except DjangoValidationError:
+            # Doublon détecté par la contrainte UNIQUE sur l'email
+            raise serializers.ValidationError({'email': _("Email déjà utilisé")})
         return user
 
 
@@ -55,7 +103,11 @@ class LoginSerializer(serializers.Serializer):
     def validate(self, data):
         login = data['login'].lower()
         password = data['password']
-        user = CustomUser.objects.filter(Q(email=login) | Q(username=login)).first()
+        # Une seule colonne indexée interrogée selon la forme de l'identifiant
+        # (repli sur username : un nom d'utilisateur peut contenir '@')
+        user = CustomUser.objects.filter(email=login).first() if '@' in login else None
+        if user is None:
+            user = CustomUser.objects.filter(username=login).first()
         if not user or not user.check_password(password):
             raise serializers.ValidationError(_("Identifiants invalides"))
         if not user.is_verified:
@@ -66,13 +118,13 @@ class LoginSerializer(serializers.Serializer):
 
 # ----------- Core serializers -----------
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(CachedFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name']
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(CachedFieldsSerializerMixin, serializers.ModelSerializer):
     category = serializers.CharField()
     image = serializers.ImageField(required=False)
 
@@ -85,6 +137,15 @@ class ProductSerializer(serializers.ModelSerializer):
         return cat
 
 
+class ProductListSerializer(ProductSerializer):
+    """
+    Variante pour les listes : sans l'image, aucune URL de stockage n'est construite par ligne.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields.pop('image', None)
+
+
 class SupplierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Supplier
@@ -111,21 +172,33 @@ class StockLevelSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'warehouse', 'quantity']
 
 
+class StockMovementListSerializer(BulkCreateListSerializer):
+    # StockMovement.save tient StockLevel à jour et post_save vérifie les alertes
+    bulk_insert = False
+
+
 class StockMovementSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockMovement
         fields = ['id', 'product', 'warehouse', 'batch', 'movement_type', 'quantity', 'timestamp', 'user']
+        list_serializer_class = StockMovementListSerializer
 
 
 # ----------- Client & order serializers -----------
 
-class ClientProfileSerializer(serializers.ModelSerializer):
-    points = serializers.IntegerField(source='loyalty.points', read_only=True)
+class ClientProfileSerializer(CachedFieldsSerializerMixin, serializers.ModelSerializer):
+    # Lu depuis l'annotation `points` posée par with_points()
+    points = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = ClientProfile
         fields = ['id', 'user', 'location', 'balance', 'points']
 
+    @staticmethod
+    def with_points(queryset):
+        # 0 pour un client sans programme de fidélité
+        return queryset.annotate(points=Coalesce(F('loyalty__points'), 0))
+
 
 class OrderLineSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -135,42 +208,140 @@ class OrderLineSerializer(serializers.ModelSerializer):
         fields = ['id', 'product', 'quantity', 'unit_price']
         read_only_fields = ['unit_price']
 
+def create_order_with_lines(validated_data, lines_data):
+    """
+    Crée la commande et toutes ses lignes en un seul INSERT multi-lignes.
+    bulk_create court-circuite OrderLine.save : le prix unitaire est donc
+    renseigné ici et le total recalculé une seule fois à la fin.
+    """
+    with transaction.atomic():
+        order = Order.objects.create(**validated_data)
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, unit_price=ln['product'].selling_price, **ln)
+            for ln in lines_data
+        ], batch_size=500)
+        order.update_total()
+    return order
+
+
+class PrefetchedProductField(serializers.PrimaryKeyRelatedField):
+    """Résout d'abord le produit parmi ceux préchargés par OrderWriteSerializer."""
+
+    def to_internal_value(self, data):
+        products = self.context.get('_products')
+        if products:
+            try:
+                product = products.get(int(data))
+            except (TypeError, ValueError):
+                product = None
+            if product is not None:
+                return product
+        return super().to_internal_value(data)
+
+
 class OrderLineWriteSerializer(serializers.ModelSerializer):
+    product = PrefetchedProductField(queryset=Product.objects.all())
+
     class Meta:
         model = OrderLine
         fields = ['product', 'quantity',]
 
+
+class OrderLineBulkListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        # Même préchargement des produits que OrderWriteSerializer
+        ids = set()
+        for ln in data if isinstance(data, list) else []:
+            try:
+                ids.add(int(ln['product']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        self.context['_products'] = Product.objects.in_bulk(ids) if ids else {}
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.context.pop('_products', None)
+
     def create(self, validated_data):
-        lines_data = validated_data.pop('lines')
+        """
+        Import de lignes en INSERT multi-lignes (lots de 1000), puis un seul
+        recalcul de total par commande touchée.
+        """
+        lines = [OrderLine(unit_price=attrs['product'].selling_price, **attrs) for attrs in validated_data]
+        order_ids = {line.order_id for line in lines}
         with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-            for ln in lines_data:
-                OrderLine.objects.create(order=order, **ln)
-        return order
-    
-class OrderSerializer(serializers.ModelSerializer):
+            # Commandes verrouillées : aucun autre import ne s'intercale dans leurs lignes
+            orders = list(Order.objects.select_for_update().filter(pk__in=order_ids).order_by('pk'))
+            last_id = OrderLine.objects.filter(order_id__in=order_ids).aggregate(last=Max('id'))['last'] or 0
+            OrderLine.objects.bulk_create(lines, batch_size=1000)
+            if not connections[OrderLine.objects.db].features.can_return_rows_from_bulk_insert:
+                # MySQL ne renvoie pas les ids : relecture par (commande, produit), dans l'ordre d'insertion
+                created = defaultdict(deque)
+                for pk, order_id, product_id in (
+                    OrderLine.objects.filter(order_id__in=order_ids, id__gt=last_id)
+                    .order_by('id').values_list('id', 'order_id', 'product_id')
+                ):
+                    created[order_id, product_id].append(pk)
+                for line in lines:
+                    line.pk = created[line.order_id, line.product_id].popleft()
+            for order in orders:
+                order.update_total()
+        return lines
+
+
+class OrderLineBulkSerializer(serializers.ModelSerializer):
+    product = PrefetchedProductField(queryset=Product.objects.all())
+
+    class Meta:
+        model = OrderLine
+        fields = ['id', 'order', 'product', 'quantity', 'unit_price']
+        read_only_fields = ['unit_price']
+        list_serializer_class = OrderLineBulkListSerializer
+
+
+class OrderSerializer(CachedFieldsSerializerMixin, serializers.ModelSerializer):
     client = ClientProfileSerializer(read_only=True)
-    lines = OrderLineSerializer(many=True)
+    lines = OrderLineSerializer(many=True, read_only=True, source='lignes_commandes')
 
     class Meta:
         model = Order
-        fields = ['id', 'client', 'date_ordered', 'order_status', 'total', 'lines']
+        fields = ['id', 'client', 'client_username', 'date_ordered', 'order_status', 'total', 'lines']
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        # 3 requêtes au total au lieu d'une par commande / ligne / fidélité
+        return queryset.prefetch_related(
+            Prefetch('client', queryset=ClientProfileSerializer.with_points(ClientProfile.objects.all())),
+            Prefetch('lignes_commandes', queryset=OrderLine.objects.select_related('product__category'))
+        )
 
 
 class OrderWriteSerializer(serializers.ModelSerializer):
-    lines = OrderLineWriteSerializer(many=True)
+    lines = OrderLineWriteSerializer(many=True, source='lignes_commandes')
 
     class Meta:
         model = Order
         fields = ['client', 'order_status', 'lines']
 
+    def to_internal_value(self, data):
+        # Un seul SELECT ... IN (...) pour tous les produits de la commande
+        lines = data.get('lines') if hasattr(data, 'get') else None
+        ids = set()
+        for ln in lines if isinstance(lines, list) else []:
+            try:
+                ids.add(int(ln['product']))
+            except (KeyError, TypeError, ValueError):
+                pass
+        self.context['_products'] = Product.objects.in_bulk(ids) if ids else {}
+        try:
+            return super().to_internal_value(data)
+        finally:
+            self.context.pop('_products', None)
+
     def create(self, validated_data):
-        lines_data = validated_data.pop('lines')
-        with transaction.atomic():
-            order = Order.objects.create(**validated_data)
-            for ln in lines_data:
-                OrderLine.objects.create(order=order, **ln)
-        return order
+        lines_data = validated_data.pop('lignes_commandes')
+        return create_order_with_lines(validated_data, lines_data)
 
 
 class InvoiceSerializer(serializers.ModelSerializer):
@@ -197,6 +368,7 @@ class NotificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Notification
         fields = ['id', 'user', 'message', 'link', 'read', 'created_at']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class PromoCodeSerializer(serializers.ModelSerializer):
@@ -217,6 +389,7 @@ class PaymentLogSerializer(serializers.ModelSerializer):
     class Meta:
         model = PaymentLog
         fields = ['id', 'order', 'attempt_time', 'payment_status', 'amount', 'info']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -230,26 +403,36 @@ class PaymentSerializer(serializers.ModelSerializer):
         if data['method'] == 'BALANCE':
             if client_profile.balance < data['amount']:
                 raise serializers.ValidationError(_("Solde insuffisant"))
-        paid = order.payments.filter(payment_status='PAID').aggregate(sum=Sum('amount'))['sum'] or 0
-        if data['amount'] > (order.total - paid):
+        if data['amount'] > (order.total - order.paid_total):
             raise serializers.ValidationError(_("Montant supérieur au solde dû"))
         return data
 
     def create(self, validated_data):
-        payment = super().create(validated_data)
-        if payment.method == 'BALANCE' and payment.payment_status == 'PAID':
-            client_profile = payment.order.client
-            client_profile.balance -= payment.amount
-            client_profile.save(update_fields=['balance'])
+        """
+        Paiement, journal, total payé et débit du solde dans une seule transaction.
+        """
+        with transaction.atomic():
+            # Commande verrouillée : deux paiements concurrents ne dépassent pas le solde dû
+            order = Order.objects.select_for_update().get(pk=validated_data['order'].pk)
+            if validated_data['amount'] > (order.total - order.paid_total):
+                raise serializers.ValidationError(_("Montant supérieur au solde dû"))
+            validated_data['order'] = order
+            payment = super().create(validated_data)
+            if payment.method == 'BALANCE' and payment.payment_status == 'PAID':
+                # Débit conditionnel : le solde est revérifié par la base, sans relecture
+                debited = ClientProfile.objects.filter(
+                    pk=order.client_id, balance__gte=payment.amount
+                ).update(balance=F('balance') - payment.amount)
+                if not debited:
+                    raise serializers.ValidationError(_("Solde insuffisant"))
         return payment
-        
-        
 
 
 class TrackingInfoSerializer(serializers.ModelSerializer):
     class Meta:
         model = TrackingInfo
         fields = ['id', 'delivery', 'tracking_status', 'location', 'timestamp']
+        list_serializer_class = BulkCreateListSerializer
 
 
 class ProofSerializer(serializers.ModelSerializer):
@@ -258,8 +441,11 @@ class ProofSerializer(serializers.ModelSerializer):
         fields = ['id', 'delivery', 'image', 'uploaded_at']
 
 
-class DeliverySerializer(serializers.ModelSerializer):
-    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all(), required=False),
+class DeliverySerializer(CachedFieldsSerializerMixin, serializers.ModelSerializer):
+    # Seule l'existence du produit est vérifiée : inutile de charger image et description
+    product = serializers.PrimaryKeyRelatedField(
+        queryset=Product.objects.only('pk'), required=False, allow_null=True
+    )
     order = serializers.PrimaryKeyRelatedField(queryset=Order.objects.all())
 
     class Meta:
@@ -281,30 +467,26 @@ class ProductReviewSerializer(serializers.ModelSerializer):
         fields = ['id', 'client', 'product', 'rating', 'comment', 'created_at', 'verified_purchase']
 
     def validate(self, data):
-        if not Order.objects.filter(client=data['client'], lines__product=data['product'], order_status=Order.DELIVERED).exists():
+        if not Order.objects.filter(client=data['client'], order_status=Order.DELIVERED, lignes_commandes__product=data['product']).exists():
             raise serializers.ValidationError(_("Le client doit avoir acheté ce produit"))
         data['verified_purchase'] = True
         return data
 
 
+EVIDENCE_MAX_SIZE = 2 * 1024 * 1024  # 2 Mo
+
+
 class RefundRequestSerializer(serializers.ModelSerializer):
-    days_remaining = serializers.SerializerMethodField()
+    # Annotation de RefundRequest.objects.with_days_remaining()
+    days_remaining = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = RefundRequest
         fields = '__all__'
         read_only_fields = ('refund_status', 'requested_at', 'processed_at')
 
-    @extend_schema_field(int)  # 👈 Swagger saura que ça retourne un entier
-    def get_days_remaining(self, obj):
-        if obj.order.order_status != Order.DELIVERED:
-            return 0
-        delta = (obj.order.date_ordered + timedelta(days=14)) - timezone.now()
-        return max(delta.days, 0)
-
     def validate_evidence(self, value):
-        max_size = 2 * 1024 * 1024  # 2 Mo
-        if value.size > max_size:
+        if value.size > EVIDENCE_MAX_SIZE:
             raise serializers.ValidationError("Fichier trop volumineux (max 2 Mo)")
         return value
 
@@ -316,6 +498,10 @@ class LoyaltyProgramSerializer(serializers.ModelSerializer):
         read_only_fields = ['points', 'last_updated', 'transactions']
 
 
+class UsePointsSerializer(serializers.Serializer):
+    points = serializers.IntegerField(min_value=1)
+
+
 # ----------- Analytics input serializers -----------
 
 class DeliveryInputSerializer(serializers.Serializer):
@@ -328,6 +514,12 @@ class DeliveryInputSerializer(serializers.Serializer):
         help_text="Quantité totale commandée pour l'estimation"
     )
 
+    def validate_client(self, value):
+        missing = {'lat', 'lng'} - value.keys()
+        if missing:
+            raise serializers.ValidationError(f"Coordonnées manquantes : {', '.join(sorted(missing))}")
+        return value
+
 
 class InventoryInputSerializer(serializers.Serializer):
     product_id = serializers.IntegerField(help_text="ID du produit")
@@ -349,6 +541,18 @@ class SalesInputSerializer(serializers.Serializer):
     )
 
 
+class DeliveryBatchInputSerializer(serializers.Serializer):
+    items = DeliveryInputSerializer(many=True, allow_empty=False)
+
+
+class InventoryBatchInputSerializer(serializers.Serializer):
+    items = InventoryInputSerializer(many=True, allow_empty=False)
+
+
+class SalesBatchInputSerializer(serializers.Serializer):
+    items = SalesInputSerializer(many=True, allow_empty=False)
+
+
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
@@ -359,6 +563,11 @@ class CustomUserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'username', 'is_verified', 'is_agriculteur', 'is_livreur', 'is_client']
 
 
+class CachedBlacklistTokenRefreshSerializer(TokenRefreshSerializer):
+    # Voit les déconnexions dont l'écriture en base est encore en file
+    token_class = CachedBlacklistRefreshToken
+
+
 class LogoutSerializer(serializers.Serializer):
     # Aucun champ requis si c’est juste une déconnexion
     message = serializers.CharField(read_only=True)
@@ -385,4 +594,11 @@ class SalesPredictSerializer(serializers.Serializer):
 class ProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'first_name', 'last_name']
\ No newline at end of file
+        fields = ['id', 'username', 'email', 'first_name', 'last_name']
+
+    def update(self, instance, validated_data):
+        # UPDATE limité aux champs envoyés : les signaux de CustomUser ignorent les autres
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
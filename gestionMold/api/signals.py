@@ -3,141 +3,226 @@
 import logging
 from datetime import timedelta
 
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from django.db.models.signals import post_save, pre_save
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
 from .models import (
     Product, Order, LoyaltyProgram, ProductReview,
     Payment, Delivery, CustomUser, RefundRequest,
-    ExchangeRequest, StockMovement, StockAlert, CustomUser, ClientProfile
+    ExchangeRequest, ReturnRequest, StockMovement, StockAlert, CustomUser, ClientProfile
+)
+from .tasks import (
+    award_loyalty_points, notify_stock_alerts, send_alert_task, send_sms_task, ws_broadcast
+)
+from .utils import (
+    ADMIN_CONTACTS_CACHE_KEY, ADMIN_CONTACT_FIELDS, adjust_stock_total, get_active_admin_contacts
 )
-from .utils import send_alert, send_sms
 
 logger = logging.getLogger(__name__)
 
 
-# 1) Alerte de stock faible
-@receiver(post_save, sender=Product)
-def notify_low_stock(sender, instance, **kwargs):
-    CRITICAL_THRESHOLD = 5
-    if instance.quantity_in_stock is not None and instance.quantity_in_stock < CRITICAL_THRESHOLD:
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            'stock_alerts',
-            {
-                'type': 'stock_alert',
-                'data': {
-                    'product': instance.name,
-                    'stock': instance.quantity_in_stock,
-                    'timestamp': timezone.now().isoformat()
-                }
-            }
-        )
+def enqueue_sms(phone_number, message):
+    # Envoi délégué à Celery, uniquement une fois la transaction validée
+    transaction.on_commit(lambda: send_sms_task.delay(phone_number, message))
+
+
+def broadcast(group, event):
+    # group_send exécuté par un worker : pas de boucle async_to_sync dans la requête
+    transaction.on_commit(lambda: ws_broadcast.delay(group, event))
+
+
+def notify_admins(message):
+    # Tout (lecture des contacts comprise) est reporté après le commit
+    transaction.on_commit(lambda: _notify_admins(message))
+
+
+def _notify_admins(message):
+    contacts = get_active_admin_contacts()
+    admin_ids = [admin_id for admin_id, _email, _phone in contacts]
+    if admin_ids:
+        send_alert_task.delay(admin_ids, message)
+    for _id, _email, phone in contacts:
+        if phone:
+            send_sms_task.delay(phone, message)
+
+
+# 1) Alerte de stock faible (uniquement au franchissement du seuil, 1 envoi/min/produit)
+CRITICAL_THRESHOLD = 5
+
+# _old_stock est posé par Product.save, avec la lecture qu'il fait déjà des anciennes valeurs
+
+@receiver(post_save, sender=Product, dispatch_uid='notify_low_stock')
+def notify_low_stock(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'quantity_in_stock' not in update_fields:
+        return
+    new = instance.quantity_in_stock
+    old = getattr(instance, '_old_stock', None)
+    if new is None or new >= CRITICAL_THRESHOLD:
+        return
+    if old is not None and old < CRITICAL_THRESHOLD:
+        return
+    event = {
+        'type': 'stock_alert',
+        'data': {
+            'product': instance.name,
+            'stock': new,
+            'timestamp': timezone.now().isoformat()
+        }
+    }
+    key = f'low_stock_sent:{instance.pk}'
+    # Anti-rebond posé après commit : un rollback ne bloque pas l'alerte suivante
+    transaction.on_commit(
+        lambda: cache.add(key, 1, timeout=60) and ws_broadcast.delay('stock_alerts', event)
+    )
+
+@receiver(post_save, sender=Product, dispatch_uid='update_stock_total_on_save')
+def update_stock_total_on_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'quantity_in_stock' not in update_fields:
+        return
+    old = 0 if created else getattr(instance, '_old_stock', None) or 0
+    delta = (instance.quantity_in_stock or 0) - old
+    transaction.on_commit(lambda: adjust_stock_total(delta))
+
+@receiver(post_delete, sender=Product, dispatch_uid='update_stock_total_on_delete')
+def update_stock_total_on_delete(sender, instance, **kwargs):
+    delta = -(instance.quantity_in_stock or 0)
+    transaction.on_commit(lambda: adjust_stock_total(delta))
 
 # 2) Création automatique de la livraison
-@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Order, dispatch_uid='create_delivery_for_new_order')
 def create_delivery_for_new_order(sender, instance, created, **kwargs):
-    if created and not Delivery.objects.filter(order=instance).exists():
-        Delivery.objects.create(order=instance)
-
-# 3) Attribution de points fidélité à la livraison
-@receiver(post_save, sender=Order)
-def award_loyalty_points_on_delivery(sender, instance, **kwargs):
-    if instance.order_status == Order.DELIVERED:
-        loyalty, _ = LoyaltyProgram.objects.get_or_create(client=instance.client)
-        if not any(txn.get('order') == instance.id for txn in loyalty.transactions):
-            points = loyalty.add_points(instance)
-            logger.debug(f"Ajout de {points} pts fidélité pour commande #{instance.id}")
+    # Une commande qui vient d'être créée n'a encore aucune livraison : pas de exists()
+    if created:
+        order_id = instance.pk
+        transaction.on_commit(lambda: Delivery.objects.create(order_id=order_id))
+
+# 3) Attribution de points fidélité au passage à DELIVERED (tâche Celery après commit)
+@receiver(pre_save, sender=Order, dispatch_uid='track_order_status_change')
+def track_order_status_change(sender, instance, update_fields=None, **kwargs):
+    instance._old_status = None
+    if instance.pk and (update_fields is None or 'order_status' in update_fields):
+        instance._old_status = Order.objects.filter(pk=instance.pk).values_list('order_status', flat=True).first()
+
+@receiver(post_save, sender=Order, dispatch_uid='award_loyalty_points_on_delivery')
+def award_loyalty_points_on_delivery(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'order_status' not in update_fields:
+        return
+    if instance.order_status == Order.DELIVERED and getattr(instance, '_old_status', None) != Order.DELIVERED:
+        order_id = instance.pk
+        transaction.on_commit(lambda: award_loyalty_points.delay(order_id))
+
+@receiver(post_delete, sender=Payment, dispatch_uid='sync_paid_total_on_payment_delete')
+def sync_paid_total_on_payment_delete(sender, instance, **kwargs):
+    # Sans effet si la commande elle-même est supprimée (cascade)
+    Order.adjust_paid_total(instance.order_id, -instance.paid_amount())
 
 # 4) Notification sur nouvel avis produit + SMS admin
-@receiver(post_save, sender=ProductReview)
+@receiver(post_save, sender=ProductReview, dispatch_uid='notify_on_product_review')
 def notify_on_product_review(sender, instance, created, **kwargs):
     if created:
-        admins = CustomUser.objects.filter(is_staff=True, is_active=True)
         message = f"Nouvel avis sur « {instance.product.name} » : {instance.rating}/5"
-        send_alert(recipient=admins, message=message)
-        for admin in admins:
-            if hasattr(admin, 'phone_number') and admin.phone_number:
-                try:
-                    send_sms(admin.phone_number, message)
-                except Exception as e:
-                    logger.warning(f"Erreur SMS admin {admin.id}: {e}")
-
-# 5) Mise à jour du statut de commande sur paiement
-@receiver(post_save, sender=Payment)
-def update_order_on_payment(sender, instance, **kwargs):
-    if instance.payment_status == Payment.PAID:
-        try:
-            instance.order.update_status_if_paid()
-        except Exception as e:
-            logger.error(f"Erreur update_status_if_paid pour commande #{instance.order.id}: {e}")
+        notify_admins(message)
+
+# 5) Statut de commande sur paiement : géré par Payment.save (update_status_if_paid)
 
 # 6) Alerte et relance sur Demande de remboursement + SMS admin
-@receiver(post_save, sender=RefundRequest)
+@receiver(post_save, sender=RefundRequest, dispatch_uid='notify_on_refund_request')
 def notify_on_refund_request(sender, instance, created, **kwargs):
     if created:
-        admins = CustomUser.objects.filter(is_staff=True, is_active=True)
-        message = f"Nouvelle demande de remboursement pour commande #{instance.order.id}"
-        send_alert(recipient=admins, message=message)
-        for admin in admins:
-            if hasattr(admin, 'phone_number') and admin.phone_number:
-                try:
-                    send_sms(admin.phone_number, message)
-                except Exception as e:
-                    logger.warning(f"Erreur SMS admin {admin.id}: {e}")
+        message = f"Nouvelle demande de remboursement pour commande #{instance.order_id}"
+        notify_admins(message)
 
 # 7) Création d'un échange de produit + SMS client
-@receiver(post_save, sender=ExchangeRequest)
+@receiver(post_save, sender=ExchangeRequest, dispatch_uid='notify_on_exchange_request')
 def notify_on_exchange_request(sender, instance, created, **kwargs):
     if created:
-        client_user = instance.return_request.order_line.order.client.user
-        message = f"Votre demande d'échange pour commande #{instance.return_request.order_line.order.id} est enregistrée"
-        send_alert(recipient=client_user, message=message)
-        if hasattr(client_user, 'phone_number') and client_user.phone_number:
-            try:
-                send_sms(client_user.phone_number, message)
-            except Exception as e:
-                logger.warning(f"Erreur SMS client {client_user.id}: {e}")
+        # Commande, client et téléphone en une seule requête
+        row = ReturnRequest.objects.filter(pk=instance.return_request_id).values_list(
+            'order_line__order_id', 'order_line__order__client__user_id', 'order_line__order__client__user__phone'
+        ).first()
+        if row is None:
+            return
+        order_id, user_id, phone = row
+        message = f"Votre demande d'échange pour commande #{order_id} est enregistrée"
+        transaction.on_commit(lambda: send_alert_task.delay([user_id], message))
+        if phone:
+            enqueue_sms(phone, message)
 
 # 8) Vérification & notification sur mouvement de stock
-@receiver(post_save, sender=StockMovement)
-def check_stock_alerts(sender, instance, **kwargs):
-    for alert in StockAlert.objects.filter(product=instance.product, is_active=True):
-        alert.check_stock()
+@receiver(post_save, sender=StockMovement, dispatch_uid='check_stock_alerts')
+def check_stock_alerts(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'quantity', 'product'}.intersection(update_fields):
+        return
+    stock = Product.objects.filter(pk=instance.product_id).values_list('quantity_in_stock', flat=True).first()
+    if stock is None:
+        return
+    triggered = [
+        alert_id for alert_id, threshold in StockAlert.objects.filter(
+            product_id=instance.product_id, is_active=True
+        ).values_list('id', 'threshold')
+        if stock <= threshold
+    ]
+    if triggered:
+        transaction.on_commit(lambda: notify_stock_alerts.delay(triggered))
 
 # 9) Gestion des signaux côté Delivery (WebSocket + SMS client)
-@receiver(post_save, sender=Delivery)
-def notify_delivery_status_change(sender, instance, **kwargs):
-    channel_layer = get_channel_layer()
-    async_to_sync(channel_layer.group_send)(
-        f"user_{instance.order.client.user.id}_deliveries",
-        {
-            'type': 'delivery_update',
-            'data': {
-                'order_id': instance.order.id,
-                'status': instance.delivery_status,
-                'updated_at': timezone.now().isoformat()
-            }
+@receiver(post_save, sender=Delivery, dispatch_uid='notify_delivery_status_change')
+def notify_delivery_status_change(sender, instance, update_fields=None, **kwargs):
+    if instance.order_id is None:
+        return
+    if update_fields is not None and 'delivery_status' not in update_fields:
+        return
+    # Client et téléphone en une seule requête au lieu de order → client → user
+    row = Order.objects.filter(pk=instance.order_id).values_list('client__user_id', 'client__user__phone').first()
+    if row is None:
+        return
+    user_id, phone = row
+    broadcast(f"user_{user_id}_deliveries", {
+        'type': 'delivery_update',
+        'data': {
+            'order_id': instance.order_id,
+            'status': instance.delivery_status,
+            'updated_at': timezone.now().isoformat()
         }
-    )
-    client_user = instance.order.client.user
-    message = f"Votre livraison pour la commande #{instance.order.id} est maintenant : {instance.delivery_status}"
-    if hasattr(client_user, 'phone_number') and client_user.phone_number:
-        try:
-            send_sms(client_user.phone_number, message)
-        except Exception as e:
-            logger.warning(f"Erreur SMS client {client_user.id}: {e}")
-
-# 10) Création de profil client avec SMS de bienvenue
-@receiver(post_save, sender=CustomUser)
-def create_client_profile(sender, instance, created, **kwargs):
-    if created and instance.is_client:
-        ClientProfile.objects.get_or_create(user=instance)
-        if hasattr(instance, 'phone_number') and instance.phone_number:
-            try:
-                send_sms(instance.phone_number, "Bienvenue sur la plateforme !")
-            except Exception as e:
-                logger.warning(f"Erreur SMS bienvenue {instance.id}: {e}")
\ No newline at end of file
+    })
+    message = f"Votre livraison pour la commande #{instance.order_id} est maintenant : {instance.delivery_status}"
+    if phone:
+        enqueue_sms(phone, message)
+
+# 10) Synchronisation du username dénormalisé sur les commandes
+@receiver(pre_save, sender=CustomUser, dispatch_uid='track_username_change')
+def track_username_change(sender, instance, update_fields=None, **kwargs):
+    instance._username_changed = False
+    if instance.pk and (update_fields is None or 'username' in update_fields):
+        old = CustomUser.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+        instance._username_changed = old is not None and old != instance.username
+
+@receiver(post_save, sender=CustomUser, dispatch_uid='sync_order_client_username')
+def sync_order_client_username(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_username_changed', False):
+        Order.objects.filter(client__user=instance).update(client_username=instance.username)
+
+@receiver(post_save, sender=CustomUser, dispatch_uid='invalidate_admin_contacts')
+def invalidate_admin_contacts(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or ADMIN_CONTACT_FIELDS.intersection(update_fields):
+        transaction.on_commit(lambda: cache.delete(ADMIN_CONTACTS_CACHE_KEY))
+
+# 11) Création de profil client avec SMS de bienvenue
+@receiver(post_save, sender=CustomUser, dispatch_uid='create_client_profile')
+def create_client_profile(sender, instance, created, raw=False, **kwargs):
+    # raw : chargement de fixtures, les profils font partie des données chargées
+    # (imports en masse : CustomUser.objects.bulk_create_clients, sans signal)
+    if raw or not (created and instance.is_client):
+        return
+    # Un seul INSERT : la contrainte UNIQUE du OneToOne remplace le SELECT de get_or_create
+    try:
+        with transaction.atomic():
+            ClientProfile.objects.create(user=instance)
+    except IntegrityError:
+        pass
+    if instance.phone:
+        enqueue_sms(instance.phone, "Bienvenue sur la plateforme !")
+
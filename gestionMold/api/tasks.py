@@ -0,0 +1,91 @@
+# api/tasks.py
+
+import logging
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import CustomUser, LoyaltyProgram, Order, Product, StockAlert
+from .utils import save_qr_code, send_alert, send_sms
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def award_loyalty_points(order_id):
+    """
+    Crédite les points fidélité d'une commande livrée, hors du cycle requête/réponse.
+    Idempotente : une commande déjà créditée est ignorée.
+    """
+    order = Order.objects.filter(pk=order_id, order_status=Order.DELIVERED).first()
+    if order is None:
+        return 0
+    loyalty, _ = LoyaltyProgram.objects.get_or_create(client_id=order.client_id)
+    with transaction.atomic():
+        # UPDATE conditionnel : un seul worker peut basculer le marqueur
+        claimed = Order.objects.filter(pk=order.pk, loyalty_awarded=False).update(loyalty_awarded=True)
+        if not claimed:
+            return 0
+        points = loyalty.add_points(order)
+    logger.debug("Ajout de %s pts fidélité pour commande #%s", points, order.id)
+    return points
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), dont_autoretry_for=(ValueError,),
+             retry_backoff=True, max_retries=5)
+def send_sms_task(self, phone_number, message):
+    """Envoi SMS via Twilio ; un numéro invalide (ValueError) n'est pas réessayé."""
+    send_sms(phone_number, message)
+
+
+@shared_task
+def send_alert_task(user_ids, message, link=None):
+    """Email + Notification pour chaque utilisateur, relus côté worker à partir de leurs ids."""
+    users = CustomUser.objects.filter(pk__in=user_ids).only('id', 'email')
+    return send_alert(recipient=users, message=message, link=link)
+
+
+@shared_task
+def notify_stock_alerts(alert_ids):
+    """Notifie les alertes de stock déclenchées, produits chargés en une requête."""
+    for alert in StockAlert.objects.filter(pk__in=alert_ids).select_related('product'):
+        alert.check_stock()
+
+
+@shared_task
+def ws_broadcast(group, event):
+    """Envoie `event` au groupe WebSocket `group` depuis le worker, hors requête."""
+    # get_channel_layer() réutilise le backend déjà instancié par channels
+    async_to_sync(get_channel_layer().group_send)(group, event)
+
+
+@shared_task(autoretry_for=(OSError,), retry_backoff=True, max_retries=3)
+def generate_product_qr(product_id, payload):
+    """
+    Génère et stocke le QR code d'un produit, hors du cycle requête/réponse,
+    puis enregistre son chemin. Ignorée si le nom ou le prix a changé depuis.
+    """
+    product = Product.objects.filter(pk=product_id).values('name', 'selling_price').first()
+    if product is None or Product.qr_code_payload(**product) != payload:
+        return None
+    path = save_qr_code(Product.qr_code_path(product_id, payload), payload)
+    Product.objects.filter(pk=product_id).update(qr_code_image=path)
+    return path
+
+
+@shared_task(ignore_result=False)
+def run_sales_prediction(payload):
+    """Prédiction de ventes exécutée par un worker de la file `ml`."""
+    from ai.predictors.sales_predictor import SalesPredictor
+    return SalesPredictor.instance(settings.SALES_MODEL_PATH).predict(payload)
+
+
+@shared_task
+def blacklist_refresh_token(token):
+    """Persiste en base la révocation d'un refresh token déjà marqué dans le cache."""
+    # verify=False : le jeton est déjà refusé par le cache, seule l'écriture compte
+    RefreshToken(token, verify=False).blacklist()
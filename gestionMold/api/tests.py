@@ -1,3 +1,592 @@
-from django.test import TestCase
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from kombu.exceptions import OperationalError
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestClassifier, RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+
+from ai.predictors.batching import BatchingPredictor
+from ai.predictors.delivery_predictor import DeliveryPredictor
+from ai.predictors.inventory_predictor import InventoryPredictor
+from ai.predictors.sales_predictor import SalesPredictor
+
+from .models import (
+    Category, ClientProfile, CustomUser, LoyaltyProgram, Order, OrderLine, Payment, Product,
+    RefundRequest, StockLevel, StockMovement, Warehouse
+)
+from .pagination import CachedCountPagination, CachedCountPaginator
+from .renderers import ORJSONRenderer
+from .serializers import SalesInputSerializer
+from .tasks import award_loyalty_points, generate_product_qr
+from .utils import get_stock_total, inventory_features, sales_features
+
+
+class ApiTestMixin:
+    """Utilisateur authentifié et catalogue minimal communs aux tests d'API."""
+
+    def setUp(self):
+        # Aucune image QR écrite dans MEDIA_ROOT par les tâches exécutées en mode eager
+        patcher = mock.patch('api.tasks.save_qr_code', side_effect=lambda path, payload: path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = CustomUser.objects.create_user(
+            username='agent', email='agent@example.com', password='secret-pass-123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Céréales')
+        self.product = Product.objects.create(
+            name='Mil', category=self.category, unit='kg',
+            purchase_price=Decimal('100'), selling_price=Decimal('150')
+        )
+        self.warehouse = Warehouse.objects.create(name='Central', location='Bamako')
+
+    def make_client(self, username='client'):
+        # create_client_profile crée le profil des utilisateurs is_client
+        user = CustomUser.objects.create_user(
+            username=username, email=f'{username}@example.com', password='secret-pass-123', is_client=True
+        )
+        return user, ClientProfile.objects.get(user=user)
+
+
+class StockMovementBulkCreateTests(ApiTestMixin, TestCase):
+
+    def test_bulk_post_updates_stock_levels_and_returns_ids(self):
+        payload = [
+            {'product': self.product.pk, 'warehouse': self.warehouse.pk, 'movement_type': 'IN', 'quantity': 10},
+            {'product': self.product.pk, 'warehouse': self.warehouse.pk, 'movement_type': 'IN', 'quantity': 5},
+            {'product': self.product.pk, 'warehouse': self.warehouse.pk, 'movement_type': 'OUT', 'quantity': 3},
+        ]
+        response = self.client.post(reverse('v1-stockmovement-list'), payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(all(row['id'] for row in response.json()))
+        self.assertEqual(StockMovement.objects.count(), 3)
+        level = StockLevel.objects.get(product=self.product, warehouse=self.warehouse)
+        self.assertEqual(level.quantity, 12)
+
+
+class StockTotalTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_counter_follows_product_saves_and_deletes(self):
+        self.assertEqual(get_stock_total(), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.quantity_in_stock = 40
+            self.product.save()
+        self.assertEqual(get_stock_total(), 40)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertEqual(get_stock_total(), 0)
+
+    def test_save_reads_previous_values_once(self):
+        self.product.quantity_in_stock = 7
+        # Lecture des anciennes valeurs + UPDATE, sans SELECT supplémentaire du signal
+        with self.assertNumQueries(2):
+            self.product.save()
+        self.assertEqual(self.product._old_stock, 0)
+
+
+class LogoutTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.refresh = str(RefreshToken.for_user(self.user))
+
+    def test_logged_out_token_is_refused_before_the_task_runs(self):
+        with mock.patch('api.tasks.blacklist_refresh_token.delay') as delay:
+            response = self.client.post(reverse('v1-auth-logout'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 205)
+        delay.assert_called_once_with(self.refresh)
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+        response = APIClient().post(reverse('jwt-refresh'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_broker_failure_falls_back_to_database_blacklist(self):
+        with mock.patch('api.tasks.blacklist_refresh_token.delay', side_effect=OperationalError):
+            response = self.client.post(reverse('v1-auth-logout'), {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, 205)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=RefreshToken(self.refresh, verify=False)['jti']).exists())
+
+    def test_invalid_token_is_rejected(self):
+        response = self.client.post(reverse('v1-auth-logout'), {'refresh': 'pas-un-jeton'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('v1-auth-logout'), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LoyaltyTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client_user, self.profile = self.make_client()
+        self.client.force_authenticate(self.client_user)
+        self.loyalty = LoyaltyProgram.objects.create(client=self.profile, points=50)
+
+    def test_points_and_history_are_updated_in_place(self):
+        order = Order.objects.create(client=self.profile, total=Decimal('250'))
+        self.assertEqual(self.loyalty.add_points(order), 25)
+        self.loyalty.use_points(30, reason='Bon d\'achat')
+
+        self.loyalty.refresh_from_db()
+        self.assertEqual(self.loyalty.points, 45)
+        self.assertEqual([entry['points'] for entry in self.loyalty.transactions], [25, -30])
+        self.assertEqual(self.loyalty.transactions[0]['order'], order.pk)
+
+    def test_use_points_refuses_overdraft(self):
+        with self.assertRaises(ValidationError):
+            self.loyalty.use_points(80)
+        self.loyalty.refresh_from_db()
+        self.assertEqual(self.loyalty.points, 50)
+
+    def test_award_task_invalidates_cached_program(self):
+        self.assertEqual(self.client.get(reverse('v1-loyalty-detail')).json()['points'], 50)
+
+        order = Order.objects.create(client=self.profile, total=Decimal('100'))
+        Order.objects.filter(pk=order.pk).update(order_status=Order.DELIVERED)
+        with self.captureOnCommitCallbacks(execute=True):
+            award_loyalty_points(order.pk)
+
+        self.assertEqual(self.client.get(reverse('v1-loyalty-detail')).json()['points'], 60)
+
+
+class PaidTotalTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        _user, profile = self.make_client()
+        self.order = Order.objects.create(client=profile, total=Decimal('300'))
+
+    def pay(self, amount, status=Payment.PAID):
+        return Payment.objects.create(order=self.order, method='CARD', amount=Decimal(amount), payment_status=status)
+
+    def paid_total(self):
+        self.order.refresh_from_db(fields=['paid_total', 'order_status'])
+        return self.order.paid_total
+
+    def test_follows_amount_and_status_changes(self):
+        payment = self.pay('100')
+        self.assertEqual(self.paid_total(), Decimal('100'))
+
+        payment.amount = Decimal('150')
+        payment.save()
+        self.assertEqual(self.paid_total(), Decimal('150'))
+
+        payment.payment_status = Payment.FAILED
+        payment.save()
+        self.assertEqual(self.paid_total(), Decimal('0'))
+
+    def test_follows_deletion(self):
+        self.pay('100')
+        payment = self.pay('200')
+        payment.delete()
+        self.assertEqual(self.paid_total(), Decimal('100'))
+
+    def test_pending_payment_does_not_count(self):
+        self.pay('100', status=Payment.PENDING)
+        self.assertEqual(self.paid_total(), Decimal('0'))
+
+    def test_deleted_payment_no_longer_blocks_new_ones(self):
+        self.pay('300').delete()
+        self.pay('300')
+        self.assertEqual(self.paid_total(), Decimal('300'))
+        self.assertEqual(self.order.order_status, Order.EN_COURS)
+
+    def test_payment_writes_apply_a_delta_without_summing(self):
+        payment = self.pay('100')
+        with CaptureQueriesContext(connection) as queries:
+            payment.amount = Decimal('120')
+            payment.save()
+            self.assertEqual(self.paid_total(), Decimal('120'))
+            payment.delete()
+        self.assertFalse([q for q in queries if 'SUM(' in q['sql'].upper()])
+        self.assertEqual(self.paid_total(), Decimal('0'))
+
+    def test_overpayment_is_refused(self):
+        self.pay('250')
+        with self.assertRaises(ValidationError):
+            self.pay('100')
+        self.assertEqual(self.paid_total(), Decimal('250'))
+        self.assertEqual(self.order.order_status, Order.PENDING)
+
+
+class FittedPredictorsMixin(ApiTestMixin):
+    """Modèles minimaux entraînés à la volée : aucun fichier .pkl n'est requis."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        rng = np.random.default_rng(0)
+
+        X = rng.random((20, len(SalesPredictor.FEATURES)))
+        scaler = StandardScaler().fit(X)
+        self.patch_predictor(
+            SalesPredictor.instance(settings.SALES_MODEL_PATH), scaler=scaler,
+            model=RandomForestRegressor(n_estimators=5, random_state=0).fit(scaler.transform(X), X[:, 0] * 10)
+        )
+
+        inventory = InventoryPredictor.instance(settings.INVENTORY_MODEL_PATH)
+        X = pd.DataFrame(rng.random((20, len(inventory.features))), columns=inventory.features)
+        self.patch_predictor(inventory, model=RandomForestClassifier(n_estimators=5, random_state=0).fit(X, [0, 1] * 10))
+
+        X = pd.DataFrame(rng.random((20, 3)), columns=['distance', 'quantity', 'season'])
+        self.patch_predictor(
+            DeliveryPredictor.instance(settings.DELIVERY_MODEL_PATH),
+            model=GradientBoostingRegressor(n_estimators=5, random_state=0).fit(X, X['distance'] * 5)
+        )
+
+    def patch_predictor(self, predictor, **attrs):
+        for name, value in attrs.items():
+            patcher = mock.patch.object(predictor, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class BatchPredictionTests(FittedPredictorsMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        Product.objects.filter(pk=self.product.pk).update(quantity_in_stock=20)
+        _user, profile = self.make_client()
+        order = Order.objects.create(client=profile, total=Decimal('0'))
+        OrderLine.objects.create(order=order, product=self.product, quantity=6)
+
+    def test_validated_fields_are_mapped_to_model_features(self):
+        features = sales_features([{'product_id': self.product.pk, 'history_days': 30, 'forecast_days': 7}])[0]
+        self.assertEqual(features['historique_ventes'], 6)
+        self.assertEqual(features['stock_disponible'], 20)
+        self.assertEqual(features['prix'], 150.0)
+
+        features = inventory_features([{'product_id': self.product.pk, 'window_days': 30}])[0]
+        self.assertEqual(features['current_stock'], 20)
+        self.assertAlmostEqual(features['sales_velocity'], 0.2)
+
+    def test_delivery_batch_returns_model_predictions(self):
+        payload = {'items': [
+            {'client': {'lat': 3.0, 'lng': 4.0}, 'total_quantity': 5},
+            {'client': {'lat': 1.0, 'lng': 1.0}, 'total_quantity': 2},
+        ]}
+        response = self.client.post(reverse('v1-predict-delivery-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        for result in response.json():
+            self.assertNotIn('error', result)
+            self.assertEqual(result['unit'], 'hours')
+
+    def test_delivery_batch_requires_coordinates(self):
+        payload = {'items': [{'client': {'lat': 3.0}, 'total_quantity': 5}]}
+        response = self.client.post(reverse('v1-predict-delivery-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_inventory_batch_returns_model_predictions(self):
+        payload = {'items': [{'product_id': self.product.pk, 'window_days': 30}]}
+        response = self.client.post(reverse('v1-predict-inventory-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        [result] = response.json()
+        self.assertNotIn('error', result)
+        self.assertEqual(result['product_id'], self.product.pk)
+        self.assertIn('stockout_risk', result)
+
+    def test_sales_batch_returns_model_predictions(self):
+        payload = {'items': [{'product_id': self.product.pk}, {'product_id': self.product.pk, 'history_days': 7}]}
+        response = self.client.post(reverse('v1-predict-sales-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+        for result in response.json():
+            self.assertNotIn('error', result)
+            self.assertIn('confidence', result)
+
+    def test_unknown_product_is_rejected(self):
+        payload = {'items': [{'product_id': self.product.pk + 1000}]}
+        response = self.client.post(reverse('v1-predict-sales-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_features_are_not_masked(self):
+        with self.assertRaises(KeyError):
+            InventoryPredictor.instance(settings.INVENTORY_MODEL_PATH).predict_stockout_batch([{'product_id': 1}])
+        with self.assertRaises(KeyError):
+            SalesPredictor.instance(settings.SALES_MODEL_PATH).predict_batch([{'product_id': 1, 'history_days': 30}])
+
+
+class SalesBatchingTests(FittedPredictorsMixin, TestCase):
+    """Le micro-batching doit aboutir au modèle, pas au repli entrée par entrée."""
+
+    def setUp(self):
+        super().setUp()
+        # Le repli appelle predict() : s'il est atteint, submit() relève l'erreur
+        self.patch_predictor(SalesPredictor, predict=mock.Mock(side_effect=AssertionError("repli utilisé")))
+
+    def test_serializer_output_goes_through_the_batcher(self):
+        serializer = SalesInputSerializer(data={'product_id': self.product.pk, 'history_days': 14})
+        serializer.is_valid(raise_exception=True)
+        batcher = BatchingPredictor(SalesPredictor.instance(settings.SALES_MODEL_PATH))
+
+        result = batcher.submit(sales_features([serializer.validated_data])[0])
+        self.assertIn('confidence', result)
+        self.assertNotIn('error', result)
+
+    def test_single_sales_endpoint_returns_model_prediction(self):
+        response = self.client.post(reverse('v1-predict-sales'), {'product_id': self.product.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('confidence', response.json())
+
+
+class OrderLineBulkCreateTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = Product.objects.create(
+            name='Sorgho', category=self.category, unit='kg',
+            purchase_price=Decimal('80'), selling_price=Decimal('120')
+        )
+        _user, profile = self.make_client()
+        self.first = Order.objects.create(client=profile)
+        self.second = Order.objects.create(client=profile)
+
+    def test_bulk_post_returns_ids_and_recomputes_each_total_once(self):
+        payload = [
+            {'order': self.first.pk, 'product': self.product.pk, 'quantity': 2},
+            {'order': self.first.pk, 'product': self.other.pk, 'quantity': 1},
+            {'order': self.first.pk, 'product': self.product.pk, 'quantity': 3},
+            {'order': self.second.pk, 'product': self.other.pk, 'quantity': 4},
+        ]
+        with mock.patch.object(Order, 'update_total', autospec=True, side_effect=Order.update_total) as update_total:
+            response = self.client.post(reverse('v1-orderline-list'), payload, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(update_total.call_count, 2)
+        for row, sent in zip(response.json(), payload):
+            line = OrderLine.objects.get(pk=row['id'])
+            self.assertEqual((line.order_id, line.product_id, line.quantity), (sent['order'], sent['product'], sent['quantity']))
+
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual(self.first.total, Decimal('870'))
+        self.assertEqual(self.second.total, Decimal('480'))
+
+
+class PredictionTaskTests(FittedPredictorsMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.payload = {'product_id': self.product.pk}
+
+    def enqueue(self):
+        pending = mock.Mock(id='task-1', **{'ready.return_value': False})
+        with mock.patch('api.views.run_sales_prediction.delay', return_value=pending) as delay:
+            response = self.client.post(reverse('v1-prediction'), self.payload, format='json')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {'task_id': 'task-1'})
+        self.assertIn('historique_ventes', delay.call_args.args[0])
+
+    def test_result_is_only_readable_by_its_requester(self):
+        self.enqueue()
+        done = mock.Mock(**{'ready.return_value': True, 'get.return_value': {'prediction': 4.2}})
+        url = reverse('v1-prediction-result', args=['task-1'])
+        with mock.patch('api.views.AsyncResult', return_value=done):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+            other, _profile = self.make_client('autre')
+            self.client.force_authenticate(other)
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_unknown_task_is_not_found(self):
+        response = self.client.get(reverse('v1-prediction-result', args=['inconnue']))
+        self.assertEqual(response.status_code, 404)
+
+    def test_form_route_answers_synchronously(self):
+        with mock.patch('api.views.run_sales_prediction.delay') as delay:
+            response = self.client.post(reverse('predict-form'), self.payload)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('confidence', response.json()['prediction'])
+        delay.assert_not_called()
+
+
+class ProductQrCodeTests(ApiTestMixin, TestCase):
+
+    def create_twin(self):
+        # Même nom et même prix dans une autre catégorie (nom unique par catégorie)
+        return Product.objects.create(
+            name='Mil', category=Category.objects.create(name='Semences'), unit='kg',
+            purchase_price=Decimal('100'), selling_price=Decimal('150')
+        )
+
+    def run_task(self, product_id, payload):
+        # save_qr_code est neutralisé par ApiTestMixin
+        return generate_product_qr(product_id, payload)
+
+    def test_creation_writes_once_and_the_worker_stores_the_path(self):
+        with mock.patch('api.tasks.generate_product_qr.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+                twin = self.create_twin()
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE') and 'api_product' in q['sql']])
+        delay.assert_called_once_with(twin.pk, 'Produit: Mil | Prix: 150.00')
+        self.assertFalse(Product.objects.get(pk=twin.pk).qr_code_image)
+
+        path = self.run_task(twin.pk, 'Produit: Mil | Prix: 150.00')
+        self.assertEqual(Product.objects.get(pk=twin.pk).qr_code_image.name, path)
+
+    def test_same_name_and_price_get_distinct_files(self):
+        twin = self.create_twin()
+        payload = 'Produit: Mil | Prix: 150.00'
+        self.assertNotEqual(self.run_task(twin.pk, payload), self.run_task(self.product.pk, payload))
+
+    def test_price_change_regenerates_the_code(self):
+        with mock.patch('api.tasks.generate_product_qr.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.selling_price = Decimal('175')
+                self.product.save()
+        delay.assert_called_once_with(self.product.pk, 'Produit: Mil | Prix: 175.00')
+        self.assertEqual(
+            self.product.qr_code_image.name,
+            Product.qr_code_path(self.product.pk, 'Produit: Mil | Prix: 175.00')
+        )
+
+    def test_outdated_task_is_ignored(self):
+        self.assertIsNone(self.run_task(self.product.pk, 'Produit: Mil | Prix: 99.00'))
+
+
+class CachedCountPaginationTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        Warehouse.objects.create(name='Nord', location='Mopti')
+
+    def test_count_is_cached_per_query(self):
+        queryset = Warehouse.objects.order_by('pk')
+        self.assertEqual(CachedCountPaginator(queryset, 10).count, 2)
+        Warehouse.objects.create(name='Sud', location='Sikasso')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCountPaginator(queryset, 10).count, 2)
+        self.assertEqual(CachedCountPaginator(queryset, 10, refresh=True).count, 3)
+        self.assertEqual(CachedCountPaginator(queryset, 10).count, 3)
+
+    def test_first_page_refreshes_the_total(self):
+        url = reverse('v1-warehouse-list')
+        with mock.patch.object(CachedCountPagination, 'page_size', 1):
+            self.assertEqual(self.client.get(url, {'page': 1}).json()['count'], 2)
+            Warehouse.objects.create(name='Sud', location='Sikasso')
+
+            self.assertEqual(self.client.get(url, {'page': 2}).json()['count'], 2)
+            self.assertEqual(self.client.get(url, {'page': 1}).json()['count'], 3)
+
+
+class ORJSONRendererTests(ApiTestMixin, TestCase):
+
+    def test_errors_keyed_by_index_are_rendered(self):
+        # Forme des erreurs de ListField / ListSerializer (DRF >= 3.17)
+        self.assertEqual(ORJSONRenderer().render({'items': {0: ['Champ requis.']}}), b'{"items":{"0":["Champ requis."]}}')
+
+    def test_invalid_batch_payload_is_a_bad_request(self):
+        payload = {'items': [{'client': {'lat': 3.0, 'lng': 4.0}, 'total_quantity': 5}, {'client': 'nulle part'}]}
+        response = self.client.post(reverse('v1-predict-delivery-batch'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.json())
+
+
+class RefundDaysRemainingTests(ApiTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        _user, self.profile = self.make_client()
+
+    def order_placed(self, days_ago, status=Order.DELIVERED):
+        order = Order.objects.create(client=self.profile)
+        Order.objects.filter(pk=order.pk).update(
+            order_status=status, date_ordered=timezone.now() - timedelta(days=days_ago, hours=1)
+        )
+        return order
+
+    def days_remaining(self, order):
+        refund = RefundRequest.objects.create(order=order, reason='Abîmé', evidence='refunds/preuve.pdf')
+        return RefundRequest.objects.with_days_remaining().get(pk=refund.pk).days_remaining
+
+    def test_annotation_counts_whole_days_left_in_the_window(self):
+        self.assertEqual(self.days_remaining(self.order_placed(3)), 10)
+        self.assertEqual(self.days_remaining(self.order_placed(20)), 0)
+        self.assertEqual(self.days_remaining(self.order_placed(3, status=Order.PENDING)), 0)
+
+    def test_create_response_includes_days_remaining(self):
+        order = self.order_placed(3)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(reverse('v1-refund-create'), {
+                'order': order.pk, 'reason': 'Abîmé',
+                'evidence': SimpleUploadedFile('preuve.pdf', b'%PDF-1.4', content_type='application/pdf'),
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['days_remaining'], 10)
+
+
+class ClientPointsTests(ApiTestMixin, TestCase):
+
+    def test_create_and_update_responses_include_points(self):
+        response = self.client.post(reverse('v1-client-list'), {'user': self.user.pk, 'location': 'Bamako'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['points'], 0)
+
+        LoyaltyProgram.objects.create(client_id=response.json()['id'], points=40)
+        response = self.client.patch(
+            reverse('v1-client-detail', args=[response.json()['id']]), {'location': 'Ségou'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['points'], 40)
+
+
+class ProductExpirationTests(ApiTestMixin, TestCase):
+
+    def test_expiration_follows_the_current_local_date(self):
+        self.product.expiration_date = timezone.localdate()
+        self.product.clean()
+        with mock.patch('django.utils.timezone.localdate', return_value=timezone.localdate() + timedelta(days=1)):
+            with self.assertRaises(ValidationError):
+                self.product.clean()
+
+
+class CustomUserEmailTests(TestCase):
+
+    def test_duplicate_email_is_a_validation_error(self):
+        CustomUser.objects.create_user(username='awa', email='awa@example.com', password='secret-pass-123')
+        with self.assertRaises(ValidationError) as ctx:
+            CustomUser.objects.create_user(username='awa2', email='awa@example.com', password='secret-pass-123')
+        self.assertIn('email', ctx.exception.message_dict)
+        self.assertEqual(CustomUser.objects.filter(email='awa@example.com').count(), 1)
+
+
+class ProfileTests(ApiTestMixin, TestCase):
+
+    def test_patch_returns_only_the_submitted_fields(self):
+        response = self.client.patch(reverse('v1-profile'), {'first_name': 'Awa'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'first_name': 'Awa'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, 'Awa')
+
+    def test_put_still_returns_the_full_profile(self):
+        response = self.client.put(reverse('v1-profile'), {'last_name': 'Traoré'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['username'], 'agent')
+        self.assertEqual(response.json()['last_name'], 'Traoré')
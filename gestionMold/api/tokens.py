@@ -0,0 +1,41 @@
+# api/tokens.py
+
+import logging
+
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from kombu.exceptions import OperationalError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+def blacklist_cache_key(jti):
+    return f'jwt_blacklist:{jti}'
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token dont la révocation est d'abord cherchée dans le cache :
+    la déconnexion y marque le jti, l'écriture en base suit via Celery.
+    """
+
+    def check_blacklist(self):
+        if cache.get(blacklist_cache_key(self.payload[api_settings.JTI_CLAIM])):
+            raise TokenError(_("Token is blacklisted"))
+        super().check_blacklist()
+
+    def blacklist_later(self):
+        from .tasks import blacklist_refresh_token
+        # Marqueur conservé jusqu'à l'expiration du jeton, au-delà il est refusé de toute façon
+        timeout = max(int(self.payload['exp'] - timezone.now().timestamp()), 1)
+        cache.set(blacklist_cache_key(self.payload[api_settings.JTI_CLAIM]), 1, timeout)
+        try:
+            blacklist_refresh_token.delay(str(self.token))
+        except OperationalError:
+            # Broker indisponible : écriture en base dans la requête plutôt que perdue
+            logger.warning("Broker indisponible, blacklist synchrone du refresh token")
+            self.blacklist()
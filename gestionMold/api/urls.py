@@ -1,7 +1,7 @@
 # api/urls.py
 
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import SimpleRouter
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
@@ -64,17 +64,18 @@ from .views import (
     LoyaltyProgramDetailView, LoyaltyProgramListCreateAPIView,
 
     # Dashboard & IA globale
-    DashboardView, PredictionView,
+    DashboardView, PredictionView, PredictionResultView,
 
     # Prédictions IA détaillées
     DeliveryPredictView, InventoryPredictView, SalesPredictView,
+    DeliveryBatchPredictView, InventoryBatchPredictView, SalesBatchPredictView,
 
     # Livraisons CRUD + actions
     DeliveryViewSet,
 )
 
 # --- router pour les viewsets Orders et Deliveries ---
-router = DefaultRouter()
+router = SimpleRouter()  # pas de vue racine ni de suffixes de format
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'deliveries', DeliveryViewSet, basename='delivery')
 
@@ -89,6 +90,8 @@ schema_view = get_schema_view(
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
+# Le schéma n'est recalculé qu'une fois par heure (introspection de toutes les vues)
+SCHEMA_CACHE_TIMEOUT = 60 * 60
 
 
 urlpatterns = [
@@ -166,17 +169,21 @@ urlpatterns = [
     # --- Dashboard & IA globale ---
     path('v1/dashboard/',       DashboardView.as_view(),                name='v1-dashboard'),
     path('v1/predict/',         PredictionView.as_view(),               name='v1-prediction'),
+    path('v1/predict/results/<str:task_id>/', PredictionResultView.as_view(), name='v1-prediction-result'),
 
     # --- Prédictions IA détaillées ---
     path('v1/predict/delivery/',  DeliveryPredictView.as_view(),         name='v1-predict-delivery'),
+    path('v1/predict/delivery/batch/', DeliveryBatchPredictView.as_view(), name='v1-predict-delivery-batch'),
     path('v1/predict/inventory/', InventoryPredictView.as_view(),       name='v1-predict-inventory'),
+    path('v1/predict/inventory/batch/', InventoryBatchPredictView.as_view(), name='v1-predict-inventory-batch'),
     path('v1/predict/sales/',     SalesPredictView.as_view(),           name='v1-predict-sales'),
+    path('v1/predict/sales/batch/', SalesBatchPredictView.as_view(),    name='v1-predict-sales-batch'),
 
     # --- Inclusion des routers pour Orders & Deliveries CRUD + actions ---
     path('v1/', include(router.urls)),
 
     # --- Documentation Swagger et ReDoc ---
-    path('swagger<format>.json', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/',               schema_view.with_ui('swagger',   cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/',                 schema_view.with_ui('redoc',     cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>.json', schema_view.without_ui(cache_timeout=SCHEMA_CACHE_TIMEOUT), name='schema-json'),
+    path('swagger/',               schema_view.with_ui('swagger',   cache_timeout=SCHEMA_CACHE_TIMEOUT), name='schema-swagger-ui'),
+    path('redoc/',                 schema_view.with_ui('redoc',     cache_timeout=SCHEMA_CACHE_TIMEOUT), name='schema-redoc'),
 ]
@@ -1,11 +1,167 @@
 # api/utils.py
 
 import logging
-from django.core.mail import send_mail, BadHeaderError
+from django.core.mail import send_mass_mail, BadHeaderError
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
+ADMIN_CONTACTS_CACHE_KEY = 'active_admin_contacts'
+ADMIN_CONTACT_FIELDS = {'email', 'phone', 'is_staff', 'is_active'}
+
+
+def get_active_admin_contacts():
+    """
+    Liste des (id, email, phone) des administrateurs actifs, mise en cache 60 s.
+    Invalidée par le signal post_save de CustomUser.
+    """
+    from django.core.cache import cache
+    from .models import CustomUser
+
+    contacts = cache.get(ADMIN_CONTACTS_CACHE_KEY)
+    if contacts is None:
+        contacts = list(
+            CustomUser.objects.filter(is_staff=True, is_active=True)
+            .values_list('id', 'email', 'phone')
+        )
+        cache.set(ADMIN_CONTACTS_CACHE_KEY, contacts, 60)
+    return contacts
+
+
+STOCK_TOTAL_CACHE_KEY = 'stock_total'
+
+
+def get_stock_total():
+    """
+    Stock total de tous les produits, tenu à jour par les signaux de Product.
+    Recalculé (une heure de validité) si la clé est absente ou expirée.
+    """
+    from django.core.cache import cache
+    from django.db.models import Sum
+    from .models import Product
+
+    total = cache.get(STOCK_TOTAL_CACHE_KEY)
+    if total is None:
+        total = Product.objects.aggregate(total=Sum('quantity_in_stock'))['total'] or 0
+        cache.set(STOCK_TOTAL_CACHE_KEY, total, 60 * 60)
+    return total
+
+
+def adjust_stock_total(delta):
+    from django.core.cache import cache
+
+    if not delta:
+        return
+    try:
+        cache.incr(STOCK_TOTAL_CACHE_KEY, delta)
+    except ValueError:
+        # Clé absente : le prochain get_stock_total recalculera
+        pass
+
+
+# Caractéristiques des modèles non suivies en base (valeurs neutres)
+INVENTORY_FEATURE_DEFAULTS = {'lead_time': 7, 'seasonality_factor': 1.0, 'supplier_reliability': 1.0}
+
+
+def current_season():
+    """Saison courante (1-4), même découpage que DeliveryPredictor."""
+    from django.utils import timezone
+
+    return (timezone.now().month % 12 + 3) // 3
+
+
+def _products_for_features(items):
+    """
+    Produits référencés par les entrées, indexés par id.
+    Lève une ValidationError (400) si un id est inconnu.
+    """
+    from django.db.models import Max
+    from rest_framework.exceptions import ValidationError
+    from .models import Product
+
+    ids = {item['product_id'] for item in items}
+    products = {
+        row['id']: row
+        for row in Product.objects.filter(id__in=ids)
+        .values('id', 'quantity_in_stock', 'selling_price')
+        .annotate(promotion=Max('remises__discount_percent'))
+    }
+    missing = ids - products.keys()
+    if missing:
+        raise ValidationError({'product_id': f"Produits inconnus : {sorted(missing)}"})
+    return products
+
+
+def _sold_quantities(items, days_field):
+    """
+    Quantités vendues (hors commandes annulées) par (produit, nombre de jours),
+    une requête par fenêtre distincte.
+    """
+    from datetime import timedelta
+    from django.db.models import Sum
+    from django.utils import timezone
+    from .models import Order, OrderLine
+
+    windows = {}
+    for item in items:
+        windows.setdefault(item[days_field], set()).add(item['product_id'])
+    sold = {}
+    for days, product_ids in windows.items():
+        rows = (
+            OrderLine.objects
+            .filter(product_id__in=product_ids, order__date_ordered__gte=timezone.now() - timedelta(days=days))
+            .exclude(order__order_status=Order.CANCELLED)
+            .values('product_id').annotate(total=Sum('quantity'))
+            .values_list('product_id', 'total')
+        )
+        sold.update({(product_id, days): total for product_id, total in rows})
+    return sold
+
+
+def sales_features(items):
+    """Entrées validées par SalesInputSerializer → caractéristiques de SalesPredictor."""
+    products = _products_for_features(items)
+    sold = _sold_quantities(items, 'history_days')
+    season = current_season()
+    return [
+        {
+            'product_id': item['product_id'],
+            'historique_ventes': sold.get((item['product_id'], item['history_days']), 0),
+            'stock_disponible': products[item['product_id']]['quantity_in_stock'],
+            'saison': season,
+            'prix': float(products[item['product_id']]['selling_price']),
+            'promotion': float(products[item['product_id']]['promotion'] or 0),
+        }
+        for item in items
+    ]
+
+
+def inventory_features(items):
+    """Entrées validées par InventoryInputSerializer → caractéristiques d'InventoryPredictor."""
+    products = _products_for_features(items)
+    sold = _sold_quantities(items, 'window_days')
+    return [
+        {
+            'product_id': item['product_id'],
+            'current_stock': products[item['product_id']]['quantity_in_stock'],
+            'sales_velocity': sold.get((item['product_id'], item['window_days']), 0) / item['window_days'],
+            **INVENTORY_FEATURE_DEFAULTS,
+        }
+        for item in items
+    ]
+
+
+def delivery_features(items):
+    """Entrées validées par DeliveryInputSerializer → format lu par DeliveryPredictor."""
+    return [
+        {
+            'client': {'location': {'lat': item['client']['lat'], 'lng': item['client']['lng']}},
+            'total_quantity': item['total_quantity'],
+        }
+        for item in items
+    ]
+
+
 def send_alert(recipient, message, link=None):
     """
     Envoie un email + crée une Notification en base.
@@ -22,13 +178,13 @@ def send_alert(recipient, message, link=None):
     elif hasattr(recipient, '__iter__'):
         users = list(recipient)
     else:
-        logger.warning(f"send_alert reçu un destinataire inattendu : {type(recipient)}")
+        logger.warning("send_alert reçu un destinataire inattendu : %s", type(recipient))
         return False
 
     subject = '🔔 Alerte - Gestion Agricole'
     from_email = getattr(settings, 'DEFAULT_FROM_EMAIL', 'noreply@domain.com')
-    success = False
 
+    recipients = []
     for obj in users:
         # Résolution de l'utilisateur CustomUser
         if isinstance(obj, ClientProfile):
@@ -36,36 +192,41 @@ def send_alert(recipient, message, link=None):
         elif isinstance(obj, CustomUser):
             user = obj
         else:
-            logger.warning(f"Ignoré send_alert pour {obj!r} (type {type(obj)})")
+            logger.warning("Ignoré send_alert pour %r (type %s)", obj, type(obj))
             continue
 
-        email = user.email
-        if not email:
-            logger.warning(f"Pas d'email pour {user!r}")
+        if not user.email:
+            logger.warning("Pas d'email pour %r", user)
             continue
+        recipients.append(user)
 
-        try:
-            send_mail(subject, message, from_email, [email], fail_silently=False)
-            logger.info(f"Alerte envoyée par email à {email}")
-            success = True
-        except BadHeaderError:
-            logger.error(f"En-tête invalide lors de l’envoi à {email}")
-            continue
-        except Exception as e:
-            logger.exception(f"Erreur envoi email à {email}: {e}")
-            continue
+    if not recipients:
+        return False
+
+    # Une seule connexion SMTP pour tous les destinataires
+    try:
+        sent = send_mass_mail(
+            [(subject, message, from_email, [user.email]) for user in recipients],
+            fail_silently=False
+        )
+    except BadHeaderError:
+        logger.error("En-tête invalide lors de l’envoi de l'alerte")
+        return False
+    except Exception as e:
+        logger.exception("Erreur envoi email d'alerte: %s", e)
+        return False
+    logger.info("Alerte envoyée par email à %s destinataire(s)", sent)
 
-        # Création de la notification en base
-        try:
-            Notification.objects.create(
-                user=user,
-                message=message,
-                link=link or ''
-            )
-        except Exception as e:
-            logger.exception(f"Impossible de créer Notification pour {user!r}: {e}")
+    # Création des notifications en base, en un seul INSERT
+    try:
+        Notification.objects.bulk_create([
+            Notification(user=user, message=message, link=link or '')
+            for user in recipients
+        ])
+    except Exception as e:
+        logger.exception("Impossible de créer les Notifications: %s", e)
 
-    return success
+    return sent > 0
 
 
 def generate_pdf(order):
@@ -83,6 +244,26 @@ def generate_pdf(order):
     buffer.seek(0)
     return ContentFile(buffer.read(), name=f"invoice_{order.id}.pdf")
 
+def save_qr_code(path, payload):
+    """
+    Génère le QR code PNG de `payload` et l'écrit dans le stockage à `path`.
+    Le chemin étant déterministe, un fichier déjà présent est réutilisé.
+    """
+    import qrcode
+    from io import BytesIO
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
+    if default_storage.exists(path):
+        return path
+    qr = qrcode.QRCode(version=1, box_size=10, border=4)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color='black', back_color='white')
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return default_storage.save(path, ContentFile(buffer.getvalue()))
+
 def send_sms(phone_number, message):
     from twilio.rest import Client
     import re
@@ -1,23 +1,29 @@
-from datetime import timedelta
-from random import randint
+from datetime import datetime, time, timedelta
 
+from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.db.models import Sum
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
 from django.utils import timezone
 from django.utils.translation import gettext as _
 
+from celery.result import AsyncResult
 from rest_framework import generics, status, viewsets
 from rest_framework.decorators import action
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated, AllowAny
 
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 from drf_spectacular.utils import extend_schema, OpenApiResponse
 
-from ai.predictors.sales_predictor import SalesPredictor
-from ai.services import predict_delivery, predict_inventory, predict_sales
+from ai.services import (
+    predict_delivery, predict_delivery_batch, predict_inventory,
+    predict_inventory_batch, predict_sales, predict_sales_batch
+)
 
 from .models import (
     CustomUser, Product, Supplier, Order, OrderLine,
@@ -28,9 +34,9 @@ from .models import (
     PaymentLog, TrackingInfo, Proof, StockAlert
 )
 from .serializers import (
-    RegistrationSerializer, LoginSerializer, ProductSerializer,
+    RegistrationSerializer, LoginSerializer, ProductSerializer, ProductListSerializer,
     DeliverySerializer, SupplierSerializer, OrderSerializer,
-    OrderLineSerializer, OrderWriteSerializer, CategorySerializer,
+    OrderLineSerializer, OrderLineBulkSerializer, OrderWriteSerializer, CategorySerializer,
     ProductReviewSerializer, RefundRequestSerializer, LoyaltyProgramSerializer,
     PaymentSerializer, WarehouseSerializer, BatchSerializer,
     StockLevelSerializer, StockMovementSerializer, InvoiceSerializer,
@@ -39,16 +45,47 @@ from .serializers import (
     PaymentLogSerializer, TrackingInfoSerializer, ProofSerializer,
     StockAlertSerializer, ClientProfileSerializer as ClientSerializer,
     DeliveryInputSerializer, InventoryInputSerializer,
-    SalesInputSerializer, CustomUserSerializer,
-    LogoutSerializer, DeliveryPredictSerializer,
-    InventoryPredictSerializer, SalesPredictSerializer, ProfileSerializer
+    SalesInputSerializer, SalesBatchInputSerializer, DeliveryBatchInputSerializer,
+    InventoryBatchInputSerializer, CustomUserSerializer,
+    LogoutSerializer, DeliveryPredictSerializer, UsePointsSerializer,
+    InventoryPredictSerializer, SalesPredictSerializer, ProfileSerializer,
+    EVIDENCE_MAX_SIZE
 )
+from .pagination import KeysetPagination
 from .permissions import IsAdminOrDelivererOrOrderOwner
-from django.shortcuts import render
+from .tasks import run_sales_prediction
+from .tokens import CachedBlacklistRefreshToken
+from .utils import delivery_features, get_stock_total, inventory_features, sales_features
+from django.shortcuts import get_object_or_404
+
+
+class AnnotatedWriteResponseMixin:
+    """
+    Relit l'objet créé ou modifié via get_queryset() : la réponse d'un POST / PUT
+    porte les mêmes annotations que celle d'un GET.
+    """
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        serializer.instance = self.get_queryset().get(pk=serializer.instance.pk)
 
 
 # ----------- Authentification -----------
 
+def token_response(user):
+    """Émet la paire de jetons JWT de l'utilisateur."""
+    refresh = RefreshToken.for_user(user)
+    # Le jeton d'accès est dérivé du refresh déjà construit : pas de second for_user
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+        'user': {'id': user.id, 'username': user.username, 'email': user.email}
+    }
+
+
 class RegistrationAPI(APIView):
     permission_classes = [AllowAny]
     serializer_class = RegistrationSerializer
@@ -61,12 +98,7 @@ class RegistrationAPI(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.save()
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'user': {'id': user.id, 'username': user.username, 'email': user.email}
-        }, status=status.HTTP_201_CREATED)
+        return Response(token_response(user), status=status.HTTP_201_CREATED)
 
 
 class LoginAPI(APIView):
@@ -81,17 +113,14 @@ class LoginAPI(APIView):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data['user']
-        refresh = RefreshToken.for_user(user)
-        return Response({
-            'refresh': str(refresh),
-            'access': str(refresh.access_token),
-            'user': {'id': user.id, 'username': user.username, 'email': user.email}
-        })
+        return Response(token_response(user))
 
 
 # ----------- Pagination -----------
 
-class ProductPagination(PageNumberPagination):
+class ProductCursorPagination(CursorPagination):
+    # Parcours par curseur sur la clé primaire : ni OFFSET ni COUNT(*) sur le catalogue
+    ordering = '-id'
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -102,11 +131,19 @@ class ProductPagination(PageNumberPagination):
 class ProductListCreateAPIView(generics.ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = ProductPagination
+    pagination_class = ProductCursorPagination
 
     def get_queryset(self):
+        if self.request.method == 'GET':
+            # category est rendue par son nom : jointure plutôt qu'une requête par produit
+            return Product.objects.select_related('category').defer('image')
         return Product.objects.all()
 
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return ProductListSerializer
+        return ProductSerializer
+
     @extend_schema(
         request=ProductSerializer,
         responses={201: OpenApiResponse(response=ProductSerializer)}
@@ -121,10 +158,21 @@ class ProductListCreateAPIView(generics.ListCreateAPIView):
 # ----------- Livraisons -----------
 
 class DeliveryViewSet(viewsets.ModelViewSet):
-    queryset = Delivery.objects.select_related('order', 'deliverer').all()
+    # order__client : lu par IsAdminOrDelivererOrOrderOwner ; le sérialiseur n'expose que des ids
+    queryset = Delivery.objects.select_related('order__client').all()
     serializer_class = DeliverySerializer
     permission_classes = [IsAdminOrDelivererOrOrderOwner]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'predict':
+            # Quantité totale de la commande calculée par la base, dans la même requête ;
+            # seules les colonnes lues par la permission sont chargées
+            queryset = queryset.only('id', 'deliverer', 'order__client__user').annotate(
+                total_quantity=Coalesce(Sum('order__lignes_commandes__quantity'), 0)
+            )
+        return queryset
+
     @action(detail=True, methods=['post'])
     @extend_schema(
         responses={200: OpenApiResponse(description="Livraison marquée terminée")}
@@ -144,9 +192,9 @@ class DeliveryViewSet(viewsets.ModelViewSet):
         delivery = self.get_object()
         data = {
             'client': {'lat': 0.0, 'lng': 0.0},
-            'total_quantity': sum(line.quantity for line in delivery.order.lines.all())
+            'total_quantity': delivery.total_quantity
         }
-        prediction = predict_delivery(data)
+        prediction = predict_delivery(delivery_features([data])[0])
         return Response({'prediction': prediction})
 
 
@@ -168,9 +216,18 @@ class SupplierDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
 # ----------- Commandes -----------
 
 class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.prefetch_related('lines').all()
+    queryset = Order.objects.all()
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = OrderSerializer.setup_eager_loading(super().get_queryset())
+        if self.action in ('list', 'retrieve'):
+            # Uniquement les colonnes lues par OrderSerializer
+            queryset = queryset.only(
+                'id', 'client', 'client_username', 'date_ordered', 'order_status', 'total'
+            )
+        return queryset
+
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return OrderWriteSerializer
@@ -181,8 +238,9 @@ class OrderViewSet(viewsets.ModelViewSet):
         responses={200: OpenApiResponse(description="Prédiction de ventes")}
     )
     def predict_sales(self, request, pk=None):
+        from ai.predictors.sales_predictor import SalesPredictor  # sklearn chargé à la demande
         order = self.get_object()
-        prediction = SalesPredictor().predict(order)
+        prediction = SalesPredictor.instance(settings.SALES_MODEL_PATH).predict(order)
         return Response({'prediction': prediction})
 
 
@@ -196,19 +254,34 @@ class DashboardView(APIView):
         responses={200: OpenApiResponse(description="Données du dashboard", response=dict)}
     )
     def get(self, request):
-        total_stock = Product.objects.aggregate(total=Sum('quantity_in_stock'))['total'] or 0
+        # Tableau de bord interrogé en boucle : même contenu pour tous, 30 s de cache
+        return Response(cache.get_or_set('dashboard:v1', self.compute_stats, 30))
+
+    @staticmethod
+    def compute_stats():
+        today = timezone.localdate()
+        days = [today - timedelta(days=i) for i in range(30)]
+        # Stock total : compteur maintenu par les signaux, sans parcours de la table
+        # Expirations : filtre sur l'index expiration_date
         expiring_soon = Product.objects.filter(
-            expiration_date__range=(timezone.now(), timezone.now() + timedelta(days=7))
+            expiration_date__range=(today, today + timedelta(days=7))
         ).count()
-        sales_trend = {
-            (timezone.now() - timedelta(days=i)).strftime('%Y-%m-%d'): randint(0, 100)
-            for i in range(30)
-        }
-        return Response({
-            'total_stock': total_stock,
+        # Commandes par jour : un seul GROUP BY sur l'index date_ordered
+        start = timezone.make_aware(datetime.combine(days[-1], time.min))
+        per_day = dict(
+            Order.objects.filter(date_ordered__gte=start)
+            .exclude(order_status=Order.CANCELLED)
+            .annotate(day=TruncDate('date_ordered'))
+            .values('day')
+            .annotate(n=Count('id'))
+            .values_list('day', 'n')
+        )
+        sales_trend = {day.isoformat(): per_day.get(day, 0) for day in days}
+        return {
+            'total_stock': get_stock_total(),
             'expiring_soon': expiring_soon,
             'sales_trend': sales_trend
-        })
+        }
 
 
 # ----------- Prédictions IA générales -----------
@@ -216,17 +289,58 @@ class DashboardView(APIView):
 class PredictionView(APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = SalesInputSerializer
+    # False : prédiction calculée dans la requête (formulaire ia/predict/form/)
+    asynchronous = True
 
     @extend_schema(
         request=SalesInputSerializer,
-        responses={200: OpenApiResponse(description="Prédiction", response=dict)}
+        responses={
+            200: OpenApiResponse(description="Prédiction", response=dict),
+            202: OpenApiResponse(description="Prédiction en file : interroger v1-prediction-result avec task_id", response=dict),
+        }
     )
     def post(self, request):
-        try:
-            prediction = SalesPredictor().predict(request.data)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
-        return Response({'prediction': prediction, 'model_version': '1.2.0'})
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        features = sales_features([serializer.validated_data])[0]
+        if not self.asynchronous:
+            return Response({'prediction': run_sales_prediction(features), 'model_version': '1.2.0'})
+        result = run_sales_prediction.delay(features)
+        if not result.ready():
+            # Seul le demandeur pourra lire le résultat
+            cache.set(prediction_owner_key(result.id), request.user.pk, settings.CELERY_RESULT_EXPIRES)
+            return Response({'task_id': result.id}, status=status.HTTP_202_ACCEPTED)
+        # Exécution synchrone (CELERY_TASK_ALWAYS_EAGER en développement)
+        return prediction_response(result)
+
+
+class PredictionResultView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses={
+        200: OpenApiResponse(description="Prédiction", response=dict),
+        202: OpenApiResponse(description="Prédiction pas encore prête", response=dict),
+        404: OpenApiResponse(description="Tâche inconnue, expirée ou d'un autre utilisateur"),
+    })
+    def get(self, request, task_id):
+        if cache.get(prediction_owner_key(task_id)) != request.user.pk:
+            return Response({'detail': _("Prédiction introuvable.")}, status=status.HTTP_404_NOT_FOUND)
+        result = AsyncResult(task_id)
+        if not result.ready():
+            return Response({'task_id': task_id, 'status': result.status}, status=status.HTTP_202_ACCEPTED)
+        return prediction_response(result)
+
+
+def prediction_owner_key(task_id):
+    return f'prediction_owner:{task_id}'
+
+
+def prediction_response(result):
+    try:
+        prediction = result.get(propagate=True)
+    except Exception as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({'prediction': prediction, 'model_version': '1.2.0'})
 
 
 # ----------- IA spécifiques -----------
@@ -242,7 +356,7 @@ class DeliveryPredictView(APIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        return Response(predict_delivery(serializer.validated_data))
+        return Response(predict_delivery(delivery_features([serializer.validated_data])[0]))
 
 
 class InventoryPredictView(APIView):
@@ -256,7 +370,35 @@ class InventoryPredictView(APIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        return Response(predict_inventory(serializer.validated_data))
+        return Response(predict_inventory(inventory_features([serializer.validated_data])[0]))
+
+
+class DeliveryBatchPredictView(APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = DeliveryBatchInputSerializer
+
+    @extend_schema(
+        request=DeliveryBatchInputSerializer,
+        responses={200: OpenApiResponse(response=DeliveryPredictSerializer(many=True))}
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(predict_delivery_batch(delivery_features(serializer.validated_data['items'])))
+
+
+class InventoryBatchPredictView(APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = InventoryBatchInputSerializer
+
+    @extend_schema(
+        request=InventoryBatchInputSerializer,
+        responses={200: OpenApiResponse(response=InventoryPredictSerializer(many=True))}
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(predict_inventory_batch(inventory_features(serializer.validated_data['items'])))
 
 
 class SalesPredictView(APIView):
@@ -270,7 +412,22 @@ class SalesPredictView(APIView):
     def post(self, request):
         serializer = self.serializer_class(data=request.data)
         serializer.is_valid(raise_exception=True)
-        return Response(predict_sales(serializer.validated_data))
+        return Response(predict_sales(sales_features([serializer.validated_data])[0]))
+
+
+class SalesBatchPredictView(APIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = SalesBatchInputSerializer
+
+    @extend_schema(
+        request=SalesBatchInputSerializer,
+        responses={200: OpenApiResponse(response=SalesPredictSerializer(many=True))}
+    )
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Un seul appel au modèle pour tout le lot
+        return Response(predict_sales_batch(sales_features(serializer.validated_data['items'])))
 
 
 # ----------- Reviews / Refunds / Loyalty / Payments -----------
@@ -281,10 +438,34 @@ class ProductReviewCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class RefundRequestCreateView(generics.CreateAPIView):
-    queryset = RefundRequest.objects.all()
+class RefundRequestCreateView(AnnotatedWriteResponseMixin, generics.CreateAPIView):
+    queryset = RefundRequest.objects.with_days_remaining()
     serializer_class = RefundRequestSerializer
     permission_classes = [IsAuthenticated]
+    # Marge pour les autres champs et les délimiteurs multipart
+    MAX_BODY_SIZE = EVIDENCE_MAX_SIZE + 64 * 1024
+
+    def create(self, request, *args, **kwargs):
+        # Rejet avant que DRF ne lise et ne mette en tampon le corps multipart
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > self.MAX_BODY_SIZE:
+            return Response(
+                {'detail': _("Fichier trop volumineux (max 2 Mo)")},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+        return super().create(request, *args, **kwargs)
+
+
+def cached_loyalty_data(user):
+    """Programme fidélité sérialisé, invalidé par add_points / use_points (60 s au plus sinon)."""
+    def load():
+        # Programme lu en une seule requête via le profil client
+        loyalty = get_object_or_404(LoyaltyProgram, client__user=user)
+        return dict(LoyaltyProgramSerializer(loyalty).data)
+    return cache.get_or_set(LoyaltyProgram.cache_key(user.id), load, 60)
 
 
 class LoyaltyProgramDetailView(generics.RetrieveAPIView):
@@ -293,7 +474,7 @@ class LoyaltyProgramDetailView(generics.RetrieveAPIView):
 
     @extend_schema(responses={200: OpenApiResponse(response=LoyaltyProgramSerializer)})
     def get(self, request):
-        return Response(request.user.client_profile.loyalty.serialize())
+        return Response(cached_loyalty_data(request.user))
 
 
 class LoyaltyProgramListCreateAPIView(generics.ListCreateAPIView):
@@ -314,12 +495,14 @@ class PaymentCreateView(generics.CreateAPIView):
 
 class LoyaltyUsePointsView(APIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = None
+    serializer_class = UsePointsSerializer
 
-    @extend_schema(request=None, responses={200: OpenApiResponse(description='Points utilisés', response=dict)})
+    @extend_schema(request=UsePointsSerializer, responses={200: OpenApiResponse(description='Points utilisés', response=dict)})
     def post(self, request):
-        points = int(request.data.get('points', 0))
-        loyalty = request.user.client_profile.loyalty
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        points = serializer.validated_data['points']
+        loyalty = get_object_or_404(LoyaltyProgram.objects.select_related('client'), client__user=request.user)
         try:
             loyalty.use_points(points)
             return Response({'success': True, 'new_balance': loyalty.points})
@@ -333,33 +516,53 @@ class LoyaltyHistoryView(APIView):
 
     @extend_schema(responses={200: OpenApiResponse(description='Historique fidélité', response=dict)})
     def get(self, request):
-        return Response(request.user.client_profile.loyalty.transactions)
+        return Response(cached_loyalty_data(request.user)['transactions'])
 
 
 # ----------- CRUD génériques (reste des entités) -----------
 
+class BulkCreateMixin:
+    """
+    Accepte aussi une liste d'objets en POST ; le list_serializer_class du
+    sérialiseur les insère par bulk_create.
+    """
+    def get_serializer(self, *args, **kwargs):
+        if isinstance(kwargs.get('data'), list):
+            kwargs['many'] = True
+        return super().get_serializer(*args, **kwargs)
+
+
 class OrderLineListCreateAPIView(generics.ListCreateAPIView):
-    queryset = OrderLine.objects.all()
+    # Produit imbriqué et nom de sa catégorie chargés par jointure
+    queryset = OrderLine.objects.select_related('product__category')
     serializer_class = OrderLineSerializer
     permission_classes = [IsAuthenticated]
-    
+
+    def create(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        # Liste de lignes : import groupé via bulk_create
+        serializer = OrderLineBulkSerializer(data=request.data, many=True, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
 class OrderLineDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = OrderLine.objects.all()
+    queryset = OrderLine.objects.select_related('product__category')
     serializer_class = OrderLineSerializer
     permission_classes = [IsAuthenticated]
 
 
-class ClientListCreateAPIView(generics.ListCreateAPIView):
-    queryset = Client.objects.all()
+class ClientListCreateAPIView(AnnotatedWriteResponseMixin, generics.ListCreateAPIView):
+    queryset = ClientSerializer.with_points(Client.objects.all())
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
     
 
 
-class ClientDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Client.objects.all()
+class ClientDetailAPIView(AnnotatedWriteResponseMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = ClientSerializer.with_points(Client.objects.all())
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
 
@@ -415,11 +618,11 @@ class StockLevelDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class StockMovementListCreateAPIView(generics.ListCreateAPIView):
+class StockMovementListCreateAPIView(BulkCreateMixin, generics.ListCreateAPIView):
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
     permission_classes = [IsAuthenticated]
-    
+    pagination_class = KeysetPagination
 
 
 class StockMovementDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -467,11 +670,11 @@ class ExchangeRequestDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class NotificationListCreateAPIView(generics.ListCreateAPIView):
+class NotificationListCreateAPIView(BulkCreateMixin, generics.ListCreateAPIView):
     queryset = Notification.objects.all()
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated]
-    
+    pagination_class = KeysetPagination
 
 
 class NotificationDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -506,11 +709,11 @@ class ProductDiscountDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class PaymentLogListCreateAPIView(generics.ListCreateAPIView):
+class PaymentLogListCreateAPIView(BulkCreateMixin, generics.ListCreateAPIView):
     queryset = PaymentLog.objects.all()
     serializer_class = PaymentLogSerializer
     permission_classes = [IsAuthenticated]
-    
+    pagination_class = KeysetPagination
 
 
 class PaymentLogDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -519,11 +722,11 @@ class PaymentLogDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class TrackingInfoListCreateAPIView(generics.ListCreateAPIView):
+class TrackingInfoListCreateAPIView(BulkCreateMixin, generics.ListCreateAPIView):
     queryset = TrackingInfo.objects.all()
     serializer_class = TrackingInfoSerializer
     permission_classes = [IsAuthenticated]
-    
+    pagination_class = KeysetPagination
 
 
 class TrackingInfoDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
@@ -567,12 +770,12 @@ class LogoutView(APIView):
     )
     def post(self, request):
         try:
-            refresh_token = request.data["refresh"]
-            token = RefreshToken(refresh_token)
-            token.blacklist()
-            return Response({"message": "Déconnexion réussie."}, status=status.HTTP_205_RESET_CONTENT)
-        except Exception:
+            token = CachedBlacklistRefreshToken(request.data["refresh"])
+        except (KeyError, TokenError):
             return Response({"error": "Token invalide ou déjà blacklisté."}, status=status.HTTP_400_BAD_REQUEST)
+        # Révocation immédiate dans le cache partagé, INSERT en base hors requête
+        token.blacklist_later()
+        return Response({"message": "Déconnexion réussie."}, status=status.HTTP_205_RESET_CONTENT)
 
 
 class ProfileView(APIView):
@@ -596,8 +799,14 @@ class ProfileView(APIView):
         serializer.save()
         return Response(serializer.data)
 
-
-# ----------- Vue de test HTML -----------
-
-def test_accueil(request):
-    return render(request, 'accueil.html')
+    @extend_schema(
+        request=ProfileSerializer,
+        responses={200: OpenApiResponse(description="Champs modifiés uniquement", response=dict)}
+    )
+    def patch(self, request):
+        serializer = self.serializer_class(request.user, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        # Réponse limitée aux champs envoyés, comme l'UPDATE
+        data = serializer.data
+        return Response({name: data[name] for name in serializer.validated_data})
@@ -0,0 +1,16 @@
+"""
+Celery config for gestionM project.
+
+It exposes the Celery application as a module-level variable named ``app``.
+Les tâches sont découvertes dans le module ``tasks`` de chaque application.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestionM.settings')
+
+app = Celery('gestionM')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
@@ -7,6 +7,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 DELIVERY_MODEL_PATH = BASE_DIR / 'ai_models' / 'delivery_model.pkl'
 INVENTORY_MODEL_PATH = BASE_DIR / 'ai_models' / 'inventory_model.pkl'
 SALES_MODEL_PATH = BASE_DIR / 'ai_models' / 'sales_model.pkl'
+# Modèles chargés au démarrage du processus plutôt qu'à la première prédiction
+PRELOAD_AI_MODELS = os.getenv('PRELOAD_AI_MODELS', '0') == '1'
 
 # === Security ===
 SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'replace-me-with-secure-key')
@@ -130,7 +132,11 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CachedCountPagination',
     'PAGE_SIZE': int(os.getenv('PAGE_SIZE', 20)),
     'EXCEPTION_HANDLER': 'rest_framework.views.exception_handler',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
@@ -143,6 +149,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv('REFRESH_TOKEN_LIFETIME_DAYS', 1))),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.CachedBlacklistTokenRefreshSerializer',
 }
 
 # === Djoser ===
@@ -165,6 +172,34 @@ CHANNEL_LAYERS = {
     },
 }
 
+# === Cache partagé ===
+# Compteurs (stock total), révocations JWT et invalidations doivent être vus par
+# tous les workers web et Celery : pas de LocMemCache propre à chaque processus
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_URL', 'redis://127.0.0.1:6379/2'),
+        'KEY_PREFIX': 'gestionm',
+    }
+}
+
+# === Celery (tâches en arrière-plan) ===
+CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
+CELERY_TASK_ALWAYS_EAGER = DEBUG  # en dev, exécution synchrone sans broker
+CELERY_TASK_IGNORE_RESULT = True  # sauf tâches déclarées ignore_result=False (prédictions)
+CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', 'redis://127.0.0.1:6379/1')
+CELERY_RESULT_EXPIRES = 60 * 60
+CELERY_TIMEZONE = 'Africa/Bamako'
+# Files séparées : un fournisseur SMS lent ne retarde pas les diffusions WebSocket
+# celery -A gestionM worker -Q broadcast | -Q sms | -Q notifications,celery | -Q ml
+CELERY_TASK_ROUTES = {
+    'api.tasks.ws_broadcast': {'queue': 'broadcast'},
+    'api.tasks.send_sms_task': {'queue': 'sms'},
+    'api.tasks.send_alert_task': {'queue': 'notifications'},
+    'api.tasks.notify_stock_alerts': {'queue': 'notifications'},
+    'api.tasks.run_sales_prediction': {'queue': 'ml'},
+}
+
 # === Logging ===
 LOGGING = {
     'version': 1,
@@ -5,14 +5,19 @@ from django.urls import path, include
 from django.views.generic import TemplateView
 from django.conf import settings
 from django.conf.urls.static import static
+from django.views.decorators.cache import cache_page
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
 from api.views import PredictionView
 
 urlpatterns = [
-    # Page d'accueil et tableau de bord
-    path('', TemplateView.as_view(template_name='accueil.html'), name='home'),
-    path('dashboard-ui/', TemplateView.as_view(template_name='dashboard.html'), name='dashboard-ui'),
+    # Page d'accueil et tableau de bord : pages statiques, rendues une fois par heure
+    path('', cache_page(60 * 60)(TemplateView.as_view(template_name='accueil.html')), name='home'),
+    path(
+        'dashboard-ui/',
+        cache_page(60 * 60)(TemplateView.as_view(template_name='dashbord.html')),
+        name='dashboard-ui'
+    ),
 
     # Administration Django
     path('admin/', admin.site.urls),
@@ -24,11 +29,11 @@ urlpatterns = [
     path('auth/', include('djoser.urls')),
     path('auth/', include('djoser.urls.jwt')),
 
-    # Prédiction IA via formulaire
-    path('ia/predict/form/', PredictionView.as_view(), name='predict-form'),
+    # Prédiction IA via formulaire : réponse directe, sans task_id à interroger
+    path('ia/predict/form/', PredictionView.as_view(asynchronous=False), name='predict-form'),
 
-    # Schéma OpenAPI
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    # Schéma OpenAPI (mis en cache une heure)
+    path('api/schema/', cache_page(60 * 60)(SpectacularAPIView.as_view()), name='schema'),
     # Swagger UI sans with_ui()
     path(
         'api/docs/swagger/',